@@ -1,11 +1,20 @@
 #!/usr/bin/env python3
 """Record2Trace - Apollo record转trace工具主程序"""
+import os
 import sys
 import argparse
 from pathlib import Path
+from typing import Iterator
 
-from src.trace_extractor import extract_trace
-from src.trace_viewer import view_trace
+
+def _iter_record_entries(directory: str) -> Iterator[os.DirEntry]:
+    """递归遍历目录，逐个产出文件名包含'.record.'的文件条目"""
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_record_entries(entry.path)
+            elif '.record.' in entry.name:
+                yield entry
 
 
 def find_latest_record(base_dir: Path = Path('raw_record')) -> Path:
@@ -21,16 +30,15 @@ def find_latest_record(base_dir: Path = Path('raw_record')) -> Path:
     if not base_dir.exists():
         raise FileNotFoundError(f"目录不存在: {base_dir}")
     
-    # 递归查找所有record文件
-    record_files = list(base_dir.rglob('*.record.*'))
+    # 递归查找所有record文件，单次遍历中取修改时间最新的
+    # 用scandir单次遍历目录树，不构造中间的Path列表（每个文件仍各需一次stat）
+    latest_entry = max(_iter_record_entries(str(base_dir)),
+                       key=lambda e: e.stat().st_mtime, default=None)
     
-    if not record_files:
+    if latest_entry is None:
         raise FileNotFoundError(f"在 {base_dir} 目录下未找到任何record文件")
     
-    # 按修改时间排序，返回最新的
-    latest_record = max(record_files, key=lambda p: p.stat().st_mtime)
-    
-    return latest_record
+    return Path(latest_entry.path)
 
 
 def main():
@@ -68,6 +76,12 @@ def main():
         default=50,
         help='CSV最大导出行数（默认50）'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='消息提取和后处理使用的进程数（默认1；0表示使用全部CPU核数）'
+    )
     
     args = parser.parse_args()
     
@@ -100,10 +114,15 @@ def main():
         # 确保输出目录存在
         output_path.parent.mkdir(parents=True, exist_ok=True)
     
+    # 参数校验通过后再导入提取/展示模块（会连带加载numpy、shapely、protobuf等），
+    # 使--help和参数错误等提前退出的情况无需承担这部分导入开销
+    from src.trace_extractor import extract_trace
+    
     try:
         # 提取轨迹
         print(f"输出文件: {output_path}")
-        result = extract_trace(str(record_path), str(output_path), args.map)
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        result = extract_trace(str(record_path), str(output_path), args.map, workers)
         
         print("\n="*50)
         print("提取统计:")
@@ -115,6 +134,7 @@ def main():
         
         # 如果指定了--view，自动展示和导出CSV
         if args.view:
+            from src.trace_viewer import view_trace
             print("\n开始展示轨迹...")
             view_trace(str(output_path), export_csv=True, max_rows=args.max_rows)
         
@@ -27,6 +27,11 @@ GEAR_MAP = {
     'GEAR_NONE': 6
 }
 
+# 按protobuf枚举整数值索引的查找表，与上面的字典一一对应
+# 直接用消息中的枚举值索引，省去枚举名字符串的转换和字典查找；超出范围的值按0处理
+TURN_SIGNAL_LUT = (0, 1, 2)  # TURN_NONE, TURN_LEFT, TURN_RIGHT
+GEAR_LUT = (0, 1, 2, 3, 4, 5, 6)  # GEAR_NEUTRAL ... GEAR_NONE，顺序同Chassis.GearPosition
+
 # 地图名称映射规则
 MAP_NAME_RULES = {
     'Sunnyvale': 'sunnyvale',
@@ -1,14 +1,91 @@
 """地图信息加载模块"""
 import json
-import warnings
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+from operator import itemgetter
 import numpy as np
-from typing import Dict, List, Optional, Tuple
+import shapely
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 from shapely.geometry import LineString, Point, Polygon
+from shapely.prepared import PreparedGeometry, prep
+from shapely.strtree import STRtree
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时退回标准库json
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # ijson为可选依赖，仅用于流式解析超大地图
+    ijson = None
+
+# 地图缓存格式版本，缓存内容结构变化时需要递增
+MAP_CACHE_VERSION = 4
+
+# 地图JSON中车道相关字段在两种命名格式下的名称
+# （MessageToJson默认输出驼峰格式，preserving_proto_field_name时为下划线格式）
+_CAMEL_LANE_KEYS = {
+    'central_curve': 'centralCurve',
+    'left_boundary': 'leftBoundary',
+    'right_boundary': 'rightBoundary',
+    'line_segment': 'lineSegment',
+    'left_neighbor_forward_lane_id': 'leftNeighborForwardLaneId',
+}
+_SNAKE_LANE_KEYS = {key: key for key in _CAMEL_LANE_KEYS}
+# 直接出现在车道对象上、可用于判断命名格式的字段
+_LANE_DETECT_FIELDS = ('central_curve', 'left_boundary', 'right_boundary', 'left_neighbor_forward_lane_id')
+
+# 从点字典中取出(x, y)坐标
+_xy = itemgetter('x', 'y')
+
+# 地图JSON超过该大小（字节）且安装了ijson时，改用mmap+流式解析以降低峰值内存
+STREAM_PARSE_MIN_SIZE = 256 * 1024 * 1024
+
+
+def _iter_json_sections(source, names: Iterable[str]) -> Iterator[Tuple[str, Iterator[Dict]]]:
+    """
+    单遍流式解析顶层为对象的JSON，按文件中的顺序逐个产出names中各顶层列表的(字段名, 元素迭代器)
+    
+    元素迭代器须在取下一个字段之前消费；未消费完的剩余部分和不在names中的字段直接跳过
+    
+    Args:
+        source: 支持read的二进制数据源
+        names: 需要的顶层字段名
+    """
+    events = ijson.parse(source, use_float=True)
+    for prefix, event, value in events:
+        if prefix or event != 'map_key':
+            continue
+        section = _iter_section_events(events, value)
+        if value in names:
+            yield value, ijson.items(section, f'{value}.item')
+        for _ in section:
+            pass
+
+
+def _iter_section_events(events: Iterator[Tuple[str, str, object]], name: str) -> Iterator[Tuple[str, str, object]]:
+    """从共享的解析事件流中取出顶层字段name的值对应的事件，到该值结束为止"""
+    for event in events:
+        yield event
+        prefix, kind, _ = event
+        # 嵌套元素的前缀为"name.xxx"，前缀恰为name且不是容器开始的事件即该值的结束（end_*或标量）
+        if prefix == name and kind not in ('start_map', 'start_array'):
+            return
 
 
 class MapInfo:
     """地图信息类，负责加载和查询地图数据"""
     
+    # 由 _build_spatial_index 生成、不写入缓存的字段（预处理几何体无法pickle）
+    _INDEX_FIELDS = (
+        '_lane_ids', '_lane_polys', '_lane_prepared', '_lane_rtree',
+        '_junction_ids', '_junction_polys', '_junction_prepared', '_junction_rtree'
+    )
+    
     def __init__(self, map_name: str, maps_dir: str = 'maps/'):
         """
         初始化地图信息
@@ -19,10 +96,11 @@ class MapInfo:
         """
         self.map_name = map_name
         self.file_path = f"{maps_dir}{map_name}.json"
+        self.cache_path = f"{maps_dir}{map_name}.cache.pkl"
         
         # 地图数据结构
         self.lane_config: Dict[str, float] = {}
-        self.lane_waypoints: Dict[str, List[np.ndarray]] = {}
+        self.lane_waypoints: Dict[str, np.ndarray] = {}
         self.lane_turn: Dict[str, int] = {}
         self.areas: Dict[str, Dict[str, Polygon]] = {
             "lane_areas": {},
@@ -34,96 +112,246 @@ class MapInfo:
         self.lane_to_road: Dict[str, str] = {}
         self.road_to_lane: Dict[str, List[str]] = {}
         self.left_lane: List[str] = []
+        self._lane_number: Dict[str, int] = {}
+        
+        # 空间索引（STRtree），与id列表一一对应
+        self._lane_ids: List[str] = []
+        self._lane_polys: List[Polygon] = []
+        self._lane_prepared: List[Optional[PreparedGeometry]] = []
+        self._lane_rtree: Optional[STRtree] = None
+        self._junction_ids: List[str] = []
+        self._junction_polys: List[Polygon] = []
+        self._junction_prepared: List[Optional[PreparedGeometry]] = []
+        self._junction_rtree: Optional[STRtree] = None
         
-        # 加载地图
-        self._load_map()
+        # 加载地图：缓存有效时直接恢复，否则解析JSON并写入缓存
+        if not self._load_cache():
+            self._load_map()
+            self._save_cache()
     
-    def _load_map(self):
-        """从JSON文件加载地图数据"""
-        with open(self.file_path, 'r') as f:
-            map_config = json.load(f)
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        for name in self._INDEX_FIELDS:
+            state.pop(name, None)
+        return state
+    
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._build_spatial_index()
+    
+    def _cache_key(self) -> Tuple[int, int, int]:
+        """缓存键：缓存版本 + 地图JSON的修改时间和大小"""
+        stat = os.stat(self.file_path)
+        return (MAP_CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+    
+    def _load_cache(self) -> bool:
+        """
+        尝试从pickle缓存恢复地图数据
         
-        # 处理车道信息
-        self._load_lanes(map_config.get('lane', []))
+        Returns:
+            是否成功从缓存加载
+        """
+        key = self._cache_key()
+        try:
+            with open(self.cache_path, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            # 缓存不存在或已损坏，重新解析JSON
+            return False
         
-        # 处理路口信息
-        self._load_junctions(map_config.get('junction', []))
+        if not isinstance(cached, dict) or cached.get('key') != key:
+            return False
         
-        # 处理人行横道
-        self._load_crosswalks(map_config.get('crosswalk', []))
+        self.__setstate__(cached['state'])
+        return True
+    
+    def _save_cache(self):
+        """
+        将解析结果写入pickle缓存，写入失败不影响使用
         
-        # 处理交通标志
-        self._load_traffic_signs(map_config.get('stopSign', []))
+        先写入同目录下的临时文件再通过os.replace原子替换，中途失败或被中断时不会留下不完整的缓存文件
+        """
+        cache_dir, cache_name = os.path.split(self.cache_path)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir or '.', prefix=cache_name + '.', suffix='.tmp')
+        except OSError:
+            return
+        try:
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(
+                        {'key': self._cache_key(), 'state': self.__getstate__()},
+                        f, protocol=pickle.HIGHEST_PROTOCOL
+                    )
+                # mkstemp创建的文件仅所有者可读写，沿用地图JSON的权限
+                shutil.copymode(self.file_path, tmp_path)
+                os.replace(tmp_path, self.cache_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except OSError:
+            pass
+    
+    def _load_map(self):
+        """从JSON文件加载地图数据"""
+        if ijson is not None and os.path.getsize(self.file_path) >= STREAM_PARSE_MIN_SIZE:
+            # 超大地图：单遍流式解析，各顶层列表的元素按文件中出现的顺序逐个交给对应的加载函数，
+            # 不在内存中构建完整的字典树
+            loaders = self._section_loaders()
+            with open(self.file_path, 'rb') as f, \
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for name, items in _iter_json_sections(mm, loaders):
+                    loaders[name](items)
+        else:
+            if orjson is not None:
+                with open(self.file_path, 'rb') as f:
+                    map_config = orjson.loads(f.read())
+            else:
+                with open(self.file_path, 'r') as f:
+                    map_config = json.load(f)
+            
+            for name, load in self._section_loaders().items():
+                load(map_config.get(name, []))
         
-        # 处理交通信号灯
-        self._load_traffic_signals(map_config.get('signal', []))
+        # 车道所在道路的车道数需要道路和车道都加载完成后计算
+        self._compute_lane_numbers()
         
-        # 处理道路信息
-        self._load_roads(map_config.get('road', []))
+        # 构建空间索引
+        self._build_spatial_index()
+    
+    def _section_loaders(self) -> Dict[str, Callable[[Iterable[Dict]], None]]:
+        """地图顶层字段名 -> 加载函数，各加载函数互不依赖，调用顺序任意"""
+        return {
+            'road': self._load_roads,
+            'lane': self._load_lanes,
+            'junction': self._load_junctions,
+            'crosswalk': self._load_crosswalks,
+            'stopSign': self._load_traffic_signs,
+            'signal': self._load_traffic_signals,
+        }
     
-    def _load_lanes(self, lanes: List[Dict]):
+    def _load_lanes(self, lanes: Iterable[Dict]):
         """加载车道信息"""
+        area_ids = []
+        area_coords = []
+        keys = None
         for lane in lanes:
+            # 字段命名格式（驼峰/下划线）整张地图一致，遇到第一条能判断格式的车道后不再判断；
+            # 无法判断的车道上两种命名的字段都不存在，按任一格式读取结果相同
+            if keys is None:
+                keys = self._detect_lane_keys(lane)
+            lane_keys = keys or _CAMEL_LANE_KEYS
+            line_key = lane_keys['line_segment']
+            
             lane_id = lane['id']['id']
             self.lane_config[lane_id] = lane['length']
-            self.lane_waypoints[lane_id] = []
             self.lane_turn[lane_id] = lane.get("turn", 0)
             
-            # 获取中心线（支持两种命名格式）
-            central_curve = lane.get('centralCurve') or lane.get('central_curve')
-            if central_curve:
-                for segment in central_curve.get('segment', []):
-                    line_segment = segment.get('lineSegment') or segment.get('line_segment')
-                    if line_segment:
-                        for point in line_segment.get('point', []):
-                            self.lane_waypoints[lane_id].append(
-                                np.array([point['x'], point['y']])
-                            )
+            # 获取中心线，整条车道存为一个(N, 2)数组
+            central_curve = lane.get(lane_keys['central_curve'])
+            self.lane_waypoints[lane_id] = self._extract_curve_points(central_curve, line_key)
             
             # 获取边界信息构建车道多边形
-            left_points = self._extract_boundary_points(
-                lane.get('leftBoundary') or lane.get('left_boundary')
-            )
-            right_points = self._extract_boundary_points(
-                lane.get('rightBoundary') or lane.get('right_boundary')
-            )
+            left_points = self._extract_boundary_points(lane.get(lane_keys['left_boundary']), line_key)
+            right_points = self._extract_boundary_points(lane.get(lane_keys['right_boundary']), line_key)
             
-            if left_points and right_points:
-                right_points.reverse()
-                polygon_points = left_points + right_points
-                self.areas["lane_areas"][lane_id] = Polygon(polygon_points)
+            if len(left_points) and len(right_points):
+                area_ids.append(lane_id)
+                area_coords.append(np.concatenate([left_points, right_points[::-1]]))
             
             # 检查是否为最左车道
-            if 'leftNeighborForwardLaneId' not in lane and 'left_neighbor_forward_lane_id' not in lane:
+            if lane_keys['left_neighbor_forward_lane_id'] not in lane:
                 self.left_lane.append(lane_id)
+        
+        self.areas["lane_areas"].update(zip(area_ids, self._build_polygons(area_coords)))
     
-    def _extract_boundary_points(self, boundary: Optional[Dict]) -> List[Tuple[float, float]]:
-        """提取边界点坐标"""
+    def _compute_lane_numbers(self):
+        """预计算各车道所在道路的车道数（最左车道编码为 车道数*100+1）"""
+        left_lanes = set(self.left_lane)
+        for lane_id in self.lane_config:
+            road_id = self.lane_to_road.get(lane_id)
+            if road_id is not None:
+                num = len(self.road_to_lane[road_id])
+                self._lane_number[lane_id] = num * 100 + 1 if lane_id in left_lanes else num
+    
+    @staticmethod
+    def _detect_lane_keys(lane: Dict) -> Optional[Dict[str, str]]:
+        """根据一条车道判断地图字段命名格式，返回字段名对照表；车道上没有可判断的字段时返回None"""
+        for keys in (_SNAKE_LANE_KEYS, _CAMEL_LANE_KEYS):
+            if any(keys[field] in lane for field in _LANE_DETECT_FIELDS):
+                return keys
+        return None
+    
+    def _extract_curve_points(self, curve: Optional[Dict], line_key: str = 'lineSegment') -> np.ndarray:
+        """提取曲线上所有点的坐标，返回(N, 2)的float64数组"""
         points = []
-        if boundary:
-            for segment in boundary.get('curve', {}).get('segment', []):
-                line_segment = segment.get('lineSegment') or segment.get('line_segment')
+        if curve:
+            for segment in curve.get('segment', []):
+                line_segment = segment.get(line_key)
                 if line_segment:
-                    for point in line_segment.get('point', []):
-                        points.append((point['x'], point['y']))
-        return points
+                    points.extend(map(_xy, line_segment.get('point', [])))
+        return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    
+    def _extract_boundary_points(self, boundary: Optional[Dict], line_key: str = 'lineSegment') -> np.ndarray:
+        """提取边界点坐标"""
+        return self._extract_curve_points(boundary.get('curve') if boundary else None, line_key)
     
-    def _load_junctions(self, junctions: List[Dict]):
+    def _load_junctions(self, junctions: Iterable[Dict]):
         """加载路口信息"""
+        area_ids = []
+        area_coords = []
         for junction in junctions:
-            junction_id = junction['id']['id']
-            points = [(p['x'], p['y']) for p in junction['polygon']['point']]
-            self.areas["junction_areas"][junction_id] = Polygon(points)
+            area_ids.append(junction['id']['id'])
+            points = list(map(_xy, junction['polygon']['point']))
+            area_coords.append(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+        polygons = self._repair_polygons(self._build_polygons(area_coords))
+        self.areas["junction_areas"].update(zip(area_ids, polygons))
     
-    def _load_crosswalks(self, crosswalks: List[Dict]):
+    def _load_crosswalks(self, crosswalks: Iterable[Dict]):
         """加载人行横道信息"""
+        area_ids = []
+        area_coords = []
         for idx, crosswalk in enumerate(crosswalks):
             polygon_points = crosswalk['polygon']['point']
             if len(polygon_points) == 4:
-                points = [(p['x'], p['y']) for p in polygon_points]
-                self.crosswalk_config[f'crosswalk{idx+1}'] = Polygon(points)
+                area_ids.append(f'crosswalk{idx+1}')
+                area_coords.append(np.array(list(map(_xy, polygon_points)), dtype=np.float64))
+        polygons = self._repair_polygons(self._build_polygons(area_coords))
+        self.crosswalk_config.update(zip(area_ids, polygons))
+    
+    def _build_polygons(self, coords_list: List[np.ndarray]) -> List[Polygon]:
+        """
+        批量构造多边形
+        
+        所有外环坐标拼接为一个数组后一次性交给shapely构造，避免逐个创建Polygon的开销
+        
+        Args:
+            coords_list: 每个多边形外环的(N, 2)坐标数组
+        
+        Returns:
+            与coords_list一一对应的多边形列表
+        """
+        counts = [len(coords) for coords in coords_list]
+        if counts and min(counts) >= 3:
+            try:
+                indices = np.repeat(np.arange(len(coords_list)), counts)
+                rings = shapely.linearrings(np.concatenate(coords_list), indices=indices)
+                return list(shapely.polygons(rings))
+            except (ValueError, shapely.errors.GEOSException):
+                pass
+        # 存在退化的外环时逐个构造，保持与单独构造Polygon相同的行为
+        return [Polygon(coords) for coords in coords_list]
+    
+    def _repair_polygons(self, polygons: List[Polygon]) -> List[Polygon]:
+        """
+        修复自相交等无效多边形，避免后续GEOS运算出错或退化
+        
+        使用make_valid而不是buffer(0)：角点顺序错乱的四边形（蝴蝶结形）经buffer(0)只剩一半，
+        make_valid则保留两部分（MultiPolygon）
+        """
+        return [polygon if polygon.is_valid else shapely.make_valid(polygon) for polygon in polygons]
     
-    def _load_traffic_signs(self, signs: List[Dict]):
+    def _load_traffic_signs(self, signs: Iterable[Dict]):
         """加载交通标志信息"""
         for sign in signs:
             sign_data = {
@@ -131,18 +359,14 @@ class MapInfo:
                 "type": "stopsign" if "stopsign" in sign['id']['id'] or "stop_sign" in sign['id']['id'] else None
             }
             
-            # 提取停止线
+            # 提取停止线（坐标只保存在LineString中，需要时通过stop_line.coords获取）
             if 'stopLine' in sign:
                 stop_line_points = sign['stopLine'][0]['segment'][0]['lineSegment']['point']
-                points = [(p['x'], p['y']) for p in stop_line_points]
-                sign_data["stop_line"] = LineString(points)
-                sign_data["stop_line_points"] = stop_line_points
-            else:
-                sign_data["stop_line_points"] = []
+                sign_data["stop_line"] = LineString(list(map(_xy, stop_line_points)))
             
             self.traffic_sign.append(sign_data)
     
-    def _load_traffic_signals(self, signals: List[Dict]):
+    def _load_traffic_signals(self, signals: Iterable[Dict]):
         """加载交通信号灯信息"""
         for signal in signals:
             signal_data = {
@@ -159,20 +383,25 @@ class MapInfo:
             # 提取停止线
             if 'stopLine' in signal:
                 stop_line_points = signal['stopLine'][0]['segment'][0]['lineSegment']['point']
-                points = [(p['x'], p['y']) for p in stop_line_points]
-                signal_data["stop_line"] = LineString(points)
-                signal_data["stop_line_points"] = stop_line_points
+                signal_data["stop_line"] = LineString(list(map(_xy, stop_line_points)))
             
             self.traffic_signals.append(signal_data)
     
-    def _load_roads(self, roads: List[Dict]):
+    def _load_roads(self, roads: Iterable[Dict]):
         """加载道路信息"""
+        lane_id_key = None
         for road in roads:
             road_id = road['id']['id']
             lane_ids = []
+            section = road['section'][0]
             
-            # 获取车道ID列表（支持两种命名格式）
-            lane_id_list = road['section'][0].get('laneId') or road['section'][0].get('lane_id', [])
+            # 获取车道ID列表（支持两种命名格式，遇到第一条带车道ID的道路后不再判断）
+            if lane_id_key is None:
+                if 'lane_id' in section:
+                    lane_id_key = 'lane_id'
+                elif 'laneId' in section:
+                    lane_id_key = 'laneId'
+            lane_id_list = section.get(lane_id_key, []) if lane_id_key else []
             for lane_id_obj in lane_id_list:
                 lane_id = lane_id_obj['id']
                 lane_ids.append(lane_id)
@@ -180,6 +409,27 @@ class MapInfo:
             
             self.road_to_lane[road_id] = lane_ids
     
+    def _build_spatial_index(self):
+        """构建STRtree空间索引，车道/路口多边形的预处理（prepare）推迟到首次命中时"""
+        self._lane_ids = list(self.areas["lane_areas"].keys())
+        self._lane_polys = list(self.areas["lane_areas"].values())
+        self._lane_prepared = [None] * len(self._lane_polys)
+        self._lane_rtree = STRtree(self._lane_polys)
+        
+        self._junction_ids = list(self.areas["junction_areas"].keys())
+        self._junction_polys = list(self.areas["junction_areas"].values())
+        self._junction_prepared = [None] * len(self._junction_polys)
+        self._junction_rtree = STRtree(self._junction_polys)
+    
+    @staticmethod
+    def _get_prepared(prepared: List[Optional[PreparedGeometry]], polys: List[Polygon],
+                      index: int) -> PreparedGeometry:
+        """获取预处理后的多边形，只有通过包围盒筛选的区域才会分配GEOS预处理结构"""
+        geom = prepared[index]
+        if geom is None:
+            geom = prepared[index] = prep(polys[index])
+        return geom
+    
     # 查询方法
     def get_lane_config(self) -> Dict[str, float]:
         """获取车道配置"""
@@ -197,64 +447,129 @@ class MapInfo:
         """获取交通信号灯"""
         return self.traffic_signals
     
-    def find_which_area_the_ego_is_in(self, ego: Polygon) -> Optional[List[Dict]]:
+    def find_which_area_the_ego_is_in(self, ego: Polygon, first_only: bool = False) -> Optional[List[Dict]]:
         """
         查找自车/障碍物所在的区域
         
         Args:
             ego: 车辆的多边形区域
+            first_only: 只需要第一个命中的区域时为True，命中后立即返回
         
         Returns:
             区域信息列表，如果不在任何区域则返回None
         """
         # 先检查是否在路口
-        result = self._check_junction_area(ego)
+        result = self._check_junction_area(ego, first_only)
         if result:
             return result
         
         # 再检查是否在车道
-        result = self._check_lane_area(ego)
+        result = self._check_lane_area(ego, first_only)
         if result:
             return result
         
         return None
     
-    def _check_lane_area(self, point: Polygon) -> List[Dict]:
+    def find_areas_for_agents(self, agents: List[Polygon], first_only: bool = False) -> List[Optional[List[Dict]]]:
+        """
+        批量查找多个车辆/障碍物所在的区域
+        
+        与逐个调用find_which_area_the_ego_is_in的结果一致，但每类区域只做一次空间索引查询
+        
+        Args:
+            agents: 车辆的多边形区域列表
+            first_only: 只需要第一个命中的区域时为True
+        
+        Returns:
+            与agents一一对应的区域信息列表，不在任何区域的位置为None
+        """
+        if not agents:
+            return []
+        
+        junction_hits = self._query_intersecting(self._junction_rtree, agents)
+        lane_hits = self._query_intersecting(self._lane_rtree, agents)
+        
+        results = []
+        for junction_idx, lane_idx in zip(junction_hits, lane_hits):
+            if first_only:
+                junction_idx, lane_idx = junction_idx[:1], lane_idx[:1]
+            # 与单个查询相同：路口优先，其次车道
+            if len(junction_idx) > 0:
+                results.append([{"junction_id": self._junction_ids[i]} for i in junction_idx])
+            elif len(lane_idx) > 0:
+                results.append([self._lane_area_info(self._lane_ids[i]) for i in lane_idx])
+            else:
+                results.append(None)
+        return results
+    
+    def find_nearest_area(self, geom: Polygon, max_distance: float) -> Optional[Tuple[str, float]]:
+        """
+        查找距离geom最近的车道/路口
+        
+        Args:
+            geom: 车辆的多边形区域
+            max_distance: 最大搜索距离，超出该距离的区域不参与比较
+        
+        Returns:
+            (区域id, 距离)，距离相同时车道优先、地图中靠前者优先；范围内没有区域时返回None
+        """
+        nearest = None
+        for tree, ids in ((self._lane_rtree, self._lane_ids), (self._junction_rtree, self._junction_ids)):
+            if not ids:
+                continue
+            indices, distances = tree.query_nearest(
+                geom, max_distance=max_distance, all_matches=True, return_distance=True)
+            if len(indices) > 0:
+                k = indices.argmin()
+                if nearest is None or distances[k] < nearest[1]:
+                    nearest = (ids[indices[k]], float(distances[k]))
+        return nearest
+    
+    def _query_intersecting(self, tree: STRtree, geoms: List[Polygon]) -> List[np.ndarray]:
+        """一次查询所有几何体相交的索引项，按输入分组并保持地图中的原始顺序"""
+        input_idx, tree_idx = tree.query(geoms, predicate='intersects')
+        order = np.lexsort((tree_idx, input_idx))
+        input_idx, tree_idx = input_idx[order], tree_idx[order]
+        bounds = np.searchsorted(input_idx, np.arange(1, len(geoms)))
+        return np.split(tree_idx, bounds)
+    
+    def _lane_area_info(self, lane_id: str) -> Dict:
+        """构造车道区域查询结果"""
+        return {
+            "lane_id": lane_id,
+            "turn": self.lane_turn.get(lane_id, 0),
+            "laneNumber": self._get_lane_number_of_road(lane_id)
+        }
+    
+    def _check_lane_area(self, point: Polygon, first_only: bool = False) -> List[Dict]:
         """检查是否在车道区域"""
         result = []
-        for lane_id, area in self.areas["lane_areas"].items():
-            if point.distance(area) == 0:
-                result.append({
-                    "lane_id": lane_id,
-                    "turn": self.lane_turn.get(lane_id, 0),
-                    "laneNumber": self._get_lane_number_of_road(lane_id)
-                })
+        # 先用包围盒筛选候选车道，排序以保持地图中的原始顺序
+        for i in sorted(self._lane_rtree.query(point)):
+            if self._get_prepared(self._lane_prepared, self._lane_polys, i).intersects(point):
+                result.append(self._lane_area_info(self._lane_ids[i]))
+                if first_only:
+                    break
         return result
     
-    def _check_junction_area(self, point: Polygon) -> List[Dict]:
+    def _check_junction_area(self, point: Polygon, first_only: bool = False) -> List[Dict]:
         """检查是否在路口区域"""
         result = []
-        for junction_id, area in self.areas["junction_areas"].items():
-            if point.distance(area) == 0:
+        for i in sorted(self._junction_rtree.query(point)):
+            if self._get_prepared(self._junction_prepared, self._junction_polys, i).intersects(point):
                 result.append({
-                    "junction_id": junction_id
+                    "junction_id": self._junction_ids[i]
                 })
+                if first_only:
+                    break
         return result
     
     def _get_lane_number_of_road(self, lane_id: str) -> int:
         """获取道路的车道数"""
-        try:
-            road_id = self.lane_to_road[lane_id]
-            num = len(self.road_to_lane[road_id])
-            if lane_id in self.left_lane:
-                return num * 100 + 1
-            return num
-        except KeyError:
-            return 0
+        return self._lane_number.get(lane_id, 0)
     
     def check_whether_two_lanes_are_in_the_same_road(self, lane_1: str, lane_2: str) -> bool:
         """检查两条车道是否在同一道路上"""
-        try:
-            return self.lane_to_road[lane_1] == self.lane_to_road[lane_2]
-        except KeyError:
-            return False
+        road_1 = self.lane_to_road.get(lane_1)
+        road_2 = self.lane_to_road.get(lane_2)
+        return road_1 is not None and road_1 == road_2
@@ -1,11 +1,179 @@
 """后处理模块 - 计算派生字段"""
+import copy
+import functools
+import logging
 import math
 import yaml
+import numpy as np
+import shapely
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
-from shapely.geometry import Polygon, Point, LineString
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from shapely.geometry import Polygon, LineString
+from shapely.geometry.base import BaseGeometry
+from shapely.strtree import STRtree
 
-from .config import DEFAULT_DISTANCE
+from .config import DEFAULT_DISTANCE, EGO_VEHICLE
+
+logger = logging.getLogger(__name__)
+
+# 自车坐标系下包围盒预筛选的容差（米），保证浮点误差不会误排除恰好接触的障碍物
+LOCAL_BOUNDS_TOLERANCE = 1e-3
+# 单帧障碍物数量达到该值时才使用包围盒预筛选
+LOCAL_BOUNDS_MIN_OBSTACLES = 16
+# 参与计算的障碍物达到该值时才用numpy批量计算，障碍物很少时逐个计算的开销更小
+VECTORIZE_MIN_OBSTACLES = 16
+# 优先级车辆/行人判定的最大距离（米），各分支的距离阈值均小于该值
+PRIORITY_MAX_DIST = 30
+# 自车不在任何车道/路口内时，距离小于该值（米）的最近车道/路口视为自车所在区域
+NEAREST_LANE_MAX_DIST = 5.0
+# 变道/掉头判定向后查看的帧数
+LANE_CHANGE_WINDOW = 10
+TURN_AROUND_WINDOW = 20
+
+# 第一遍（单时刻字段）写入的自车/真值字段，并行处理时由工作进程传回主进程
+SINGLE_TIMESTAMP_EGO_FIELDS = frozenset({
+    "currentLane", "crosswalkAhead", "junctionAhead", "junction_ahead", "stopSignAhead", "stoplineAhead",
+    "isTrafficJam",
+})
+SINGLE_TIMESTAMP_TRUTH_FIELDS = frozenset({"NPCAhead", "PedAhead", "NPCOpposite", "npcClassification"})
+
+# 前方区域查询的地图要素类别
+AHEAD_CROSSWALK = 0
+AHEAD_JUNCTION = 1
+AHEAD_STOP_SIGN = 2
+AHEAD_SIGNAL_STOP_LINE = 3
+
+# 障碍物与自车航向差的分类结果
+HEADING_OTHER = 0
+HEADING_PERPENDICULAR = 1
+HEADING_SAME = 2
+HEADING_OPPOSITE = 3
+
+# 优先级判定的五个区域在车尾坐标系（原点为车尾中点，x轴正方向为车头朝向）下的角点，
+# 依次为前方大区域（宽200、长200的梯形）、左前方、右前方、左后方、右后方
+PRIORITY_SECTOR_CORNERS = np.array([
+    ((200, 200), (200, -200), (0, -200/2), (0, 200/2)),
+    ((30, 0), (30, -30), (0, -30), (0, 0)),
+    ((30, 30), (30, 0), (0, 0), (0, 30)),
+    ((0, 0), (0, -3), (-30, -3), (-30, 0)),
+    ((0, 3), (0, 0), (-30, 0), (-30, 3)),
+], dtype=np.float64)
+# 左后方/右后方区域还需沿y方向偏移(车宽/2 + 0.3)，各区域的偏移方向
+PRIORITY_SECTOR_SIDES = np.array([0, 0, 0, -1, 1], dtype=np.float64)
+
+
+class EgoPose(NamedTuple):
+    """一帧自车位姿的派生量，由_get_ego_poses对整条轨迹一次性提取，避免逐帧多层dict.get"""
+    head_point: Tuple[float, float]
+    back_point: Tuple[float, float]
+    heading: float
+    width: float
+    speed: float
+    # 相对上一帧的纵向加速度，首帧或时间戳不递增时为0
+    accel: float
+    # 截至该帧连续静止的时长
+    stopped_duration: float
+    # 是否强制制动（加速度或制动踏板超过阈值）
+    hard_brake: bool
+
+
+@functools.lru_cache(maxsize=8)
+def _load_config(config_file: str, mtime_ns: int) -> Dict:
+    """
+    解析后处理配置文件，同一文件只解析一次
+    
+    Args:
+        config_file: 配置文件路径
+        mtime_ns: 文件修改时间，作为缓存键的一部分，文件修改后重新解析
+    
+    Returns:
+        配置字典（缓存对象，调用方不应修改）
+    """
+    with open(config_file, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def classify_heading(thetas: List[float], ego_heading: float) -> List[int]:
+    """
+    计算各障碍物与自车的航向差并分类
+    
+    负角度先加2π归一化到[0, 2π)，再取航向差的绝对值diff：diff < π/4为同向，
+    π/4 < diff < 3π/4为垂直，3π/4 < diff < 5π/4为对向，其余（含恰好落在边界上的值）为其他。
+    障碍物较少时逐个计算，否则用numpy批量计算，两种方式结果一致
+    
+    Args:
+        thetas: 障碍物航向角列表
+        ego_heading: 自车航向角
+    
+    Returns:
+        与thetas一一对应的分类结果，取值为HEADING_OTHER/HEADING_PERPENDICULAR/HEADING_SAME/HEADING_OPPOSITE
+    """
+    if len(thetas) < VECTORIZE_MIN_OBSTACLES:
+        return [_classify_one_heading(theta, ego_heading) for theta in thetas]
+    
+    two_pi = 2 * math.pi
+    thetas = np.asarray(thetas, dtype=np.float64)
+    thetas = np.where(thetas < 0, thetas + two_pi, thetas)
+    if ego_heading < 0:
+        ego_heading = ego_heading + two_pi
+    diffs = np.abs(thetas - ego_heading)
+    
+    codes = np.full(len(diffs), HEADING_OTHER, dtype=np.int8)
+    codes[diffs < math.pi/4] = HEADING_SAME
+    codes[(math.pi/4 < diffs) & (diffs < 3*math.pi/4)] = HEADING_PERPENDICULAR
+    codes[(3*math.pi/4 < diffs) & (diffs < 5*math.pi/4)] = HEADING_OPPOSITE
+    return codes.tolist()
+
+
+def _classify_one_heading(theta: float, ego_heading: float) -> int:
+    """单个障碍物的航向差分类，规则同classify_heading"""
+    two_pi = 2 * math.pi
+    if theta < 0:
+        theta = theta + two_pi
+    if ego_heading < 0:
+        ego_heading = ego_heading + two_pi
+    diff = abs(theta - ego_heading)
+    
+    if diff < math.pi/4:
+        return HEADING_SAME
+    if math.pi/4 < diff < 3*math.pi/4:
+        return HEADING_PERPENDICULAR
+    if 3*math.pi/4 < diff < 5*math.pi/4:
+        return HEADING_OPPOSITE
+    return HEADING_OTHER
+
+
+@functools.lru_cache(maxsize=8)
+def _get_ahead_extents(width: float) -> np.ndarray:
+    """
+    前方区域和30米前方区域在车头坐标系下的包围盒，只取决于车宽，按车宽缓存
+    
+    Returns:
+        (2, 4)数组，各区域的(min_x, min_y, max_x, max_y)（缓存对象，调用方不应修改）
+    """
+    return np.array([
+        (0, -max(200, width / 2), 200, max(200, width / 2)),
+        (0, -max(30, width / 2), 30, max(30, width / 2)),
+    ])
+
+
+@functools.lru_cache(maxsize=8)
+def _get_priority_sector_geometry(width: float) -> Tuple[List[List[List[float]]], np.ndarray]:
+    """
+    优先级判定五个区域在车尾坐标系下的角点及其包围盒，只取决于车宽，按车宽缓存
+    
+    Args:
+        width: 自车车宽
+    
+    Returns:
+        (角点嵌套列表，形状同PRIORITY_SECTOR_CORNERS即(5, 4, 2)；(5, 4)数组，各区域的(min_x, min_y, max_x, max_y))，
+        均为缓存对象，调用方不应修改
+    """
+    corners = PRIORITY_SECTOR_CORNERS.copy()
+    corners[:, :, 1] += PRIORITY_SECTOR_SIDES[:, None] * (width/2 + 0.3)
+    extents = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+    return corners.tolist(), extents
 
 
 class PostProcessor:
@@ -20,6 +188,7 @@ class PostProcessor:
             config_path: 配置文件路径，如果为None则使用默认配置
         """
         self.map_info = map_info
+        self._config_path = config_path
         
         # 加载配置
         if config_path is None:
@@ -27,58 +196,233 @@ class PostProcessor:
         else:
             config_file = Path(config_path)
         
-        with open(config_file, 'r', encoding='utf-8') as f:
-            self.config = yaml.safe_load(f)
+        # 解析结果按文件缓存，每个实例持有独立的副本
+        self.config = copy.deepcopy(_load_config(str(config_file), config_file.stat().st_mtime_ns))
+        
+        # 信号阈值每帧都要用到，加载时展开为实例属性，避免逐帧多层字典查找
+        self._inf = self.config['defaults']['infinity']
+        self._d_safe_d0 = self.config['longitudinal']['d_safe_d0']
+        self._d_safe_k = self.config['longitudinal']['d_safe_k']
+        self._min_velocity_thw = self.config['longitudinal']['min_velocity_thw']
+        self._min_velocity_ttc = self.config['longitudinal']['min_velocity_ttc']
+        self._hard_brake_accel = self.config['braking']['hard_brake_accel']
+        self._hard_brake_percentage = self.config['braking']['hard_brake_percentage']
+        self._lane_offset_threshold = self.config['lateral']['lane_offset_threshold']
+        self._red_light_range = self.config['traffic_light']['red_light_range']
+        self._stop_sign_range = self.config['stop_sign']['stop_sign_range']
+        self._crosswalk_buffer = self.config['crosswalk']['crosswalk_buffer']
+        self._stopped_velocity = self.config['mission']['stopped_velocity']
+        self._unjustified_stop_duration = self.config['mission']['unjustified_stop_duration']
+        self._unjustified_stop_front_dist = self.config['mission']['unjustified_stop_front_dist']
+        
+        # 自车不在任何车道/路口内的警告只输出一次
+        self._lane_warning_printed = False
+        # 自车区域缺失的警告和地图为空的错误同样只输出一次
+        self._ego_area_warning_printed = False
+        self._empty_map_error_printed = False
+        
+        # 自车所在车道组合 -> (转向编码, 车道数)，相邻帧通常落在同一组车道内
+        self._lane_cache: Dict[Tuple[str, ...], Tuple[int, int]] = {}
+        
+        # 静态地图要素的空间索引（STRtree），每帧只对包围盒相交的候选项做精确计算
+        # 人行横道、路口、停止标志和红绿灯停止线合用一棵树，名称为(类别, id)，每帧只查询一次
+        ahead_items = []
+        ahead_items.extend(((AHEAD_CROSSWALK, cw_id), cw_area)
+                           for cw_id, cw_area in map_info.get_crosswalk_config().items())
+        ahead_items.extend(((AHEAD_JUNCTION, junc_id), junc_area)
+                           for junc_id, junc_area in map_info.areas["junction_areas"].items())
+        ahead_items.extend(((AHEAD_STOP_SIGN, sign["id"]), sign.get("stop_line"))
+                           for sign in map_info.get_traffic_sign())
+        ahead_items.extend(((AHEAD_SIGNAL_STOP_LINE, signal["id"]), signal.get("stop_line"))
+                           for signal in map_info.get_traffic_signals())
+        self._ahead_keys, self._ahead_geoms, self._ahead_tree = self._build_spatial_index(ahead_items)
+        # 人行横道单独建一棵树，供逐行人查询附近的人行横道
+        self._crosswalk_areas = [cw_area for (kind, _), cw_area in zip(self._ahead_keys, self._ahead_geoms)
+                                 if kind == AHEAD_CROSSWALK]
+        self._crosswalk_tree = STRtree(self._crosswalk_areas)
+        self._crosswalk_array = np.array(self._crosswalk_areas, dtype=object)
+        # 两条车道是否在同一道路上只取决于静态地图，结果按车道对缓存
+        self._same_road_cache: Dict[Tuple[str, str], bool] = {}
+    
+    @staticmethod
+    def _build_spatial_index(items: Iterable[Tuple[str, Optional[BaseGeometry]]]
+                             ) -> Tuple[List[str], List[BaseGeometry], STRtree]:
+        """
+        为一组地图要素构建STRtree，跳过缺失或为空的几何体
         
-        # 用于跟踪停滞时长
-        self.stopped_duration_tracker = {}
+        Returns:
+            (名称列表, 几何体列表, STRtree)，三者按索引一一对应且保持原有顺序
+        """
+        ids = []
+        geoms = []
+        for item_id, geom in items:
+            if geom:
+                ids.append(item_id)
+                geoms.append(geom)
+        return ids, geoms, STRtree(geoms)
     
-    def process_trace(self, trace: Dict) -> Dict:
+    @staticmethod
+    def _query_candidates(tree: STRtree, geom: BaseGeometry) -> List[int]:
+        """查询与geom接触（intersects）的项的索引，按原有顺序排列；STRtree会对geom做prepare后再精确判断"""
+        return sorted(tree.query(geom, predicate='intersects'))
+    
+    def process_trace(self, trace: Dict, workers: int = 1) -> Dict:
         """
         处理完整轨迹，添加派生字段
         
         Args:
             trace: 轨迹字典 {timestamp: trace_point}
+            workers: 第一遍使用的进程数，大于1时各帧的单时刻字段由进程池并行计算
         
         Returns:
             处理后的轨迹
         """
-        timestamps = sorted(trace.keys())
+        frames = self._get_sorted_frames(trace)
+        egos = [trace_point["ego"] for _, trace_point in frames]
+        
+        # 车头/车尾中点、航向、车宽、自车速度和加速度只依赖pose、size和时间戳，对整条轨迹批量提取
+        poses = self._get_ego_poses(egos, [ts for ts, _ in frames])
         
-        # 第一遍：计算单时刻的字段
-        for ts in timestamps:
-            self._process_single_timestamp(trace[ts])
+        # 第一遍：计算单时刻的字段，各帧的障碍物列数据留给第二遍复用
+        if workers > 1 and len(frames) > 1:
+            obstacle_columns = self._process_single_timestamps_parallel(frames, poses, workers)
+        else:
+            obstacle_columns = [self._process_single_timestamp(trace_point, pose)
+                                for (_, trace_point), pose in zip(frames, poses)]
+        
+        # 变道/掉头只依赖第一遍的结果，先对整条轨迹批量计算
+        lane_changing = self._find_lane_changing_frames(egos)
+        turning_around = self._find_turning_around_frames(egos, poses)
         
         # 第二遍：计算需要历史信息的字段
-        for i, ts in enumerate(timestamps):
-            self._process_temporal_fields(trace, timestamps, i)
+        for i in range(len(frames)):
+            self._process_temporal_fields(frames, i, lane_changing, turning_around, poses[i],
+                                          obstacle_columns[i])
         
         return trace
     
-    def _process_single_timestamp(self, trace_point: Dict):
-        """处理单个时间戳的派生字段"""
+    def _process_single_timestamps_parallel(self, frames: List[Tuple[float, Dict]], poses: List[EgoPose],
+                                            workers: int) -> List[Dict]:
+        """
+        用进程池并行计算各帧的单时刻字段，帧之间互不依赖
+        
+        每个工作进程用同一份地图和配置构造自己的PostProcessor，只把第一遍写入的字段传回主进程合并
+        
+        Args:
+            frames: 按时间排序的(timestamp, trace_point)列表
+            poses: 与frames对应的自车位姿派生量
+            workers: 进程数
+        
+        Returns:
+            各帧障碍物的列数据，见_get_obstacle_columns
+        """
+        items = [(trace_point["ego"], trace_point["truth"], pose) for (_, trace_point), pose in zip(frames, poses)]
+        chunk_size = max(1, math.ceil(len(items) / (workers * 4)))
+        starts = range(0, len(items), chunk_size)
+        chunks = [items[start:start + chunk_size] for start in starts]
+        
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_first_pass_worker,
+                                 initargs=(self.map_info, self._config_path)) as executor:
+            for chunk, results in zip(chunks, executor.map(_process_first_pass_chunk, chunks)):
+                for (ego, truth, _), (ego_fields, truth_fields) in zip(chunk, results):
+                    ego.update(ego_fields)
+                    truth.update(truth_fields)
+        
+        # 列数据中的障碍物多边形需要引用主进程中的对象，在主进程重新提取
+        return [self._get_obstacle_columns(truth.get('obsList', [])) for _, truth, _ in items]
+    
+    @staticmethod
+    def _get_sorted_frames(trace: Dict) -> List[Tuple[float, Dict]]:
+        """
+        将轨迹转换为按时间排序的(timestamp, trace_point)列表
+        
+        轨迹通常已按时间顺序构建，此时直接沿用字典顺序，不再排序
+        """
+        timestamps = list(trace)
+        if any(prev_ts > ts for prev_ts, ts in zip(timestamps, timestamps[1:])):
+            timestamps.sort()
+        return [(ts, trace[ts]) for ts in timestamps]
+    
+    def _process_single_timestamp(self, trace_point: Dict, pose: EgoPose) -> Dict:
+        """
+        处理单个时间戳的派生字段
+        
+        Args:
+            trace_point: 轨迹点
+            pose: 自车位姿派生量，见_get_ego_poses
+        
+        Returns:
+            该帧障碍物的列数据，见_get_obstacle_columns
+        """
         ego = trace_point["ego"]
         truth = trace_point["truth"]
         
+        # 障碍物字段每帧只读取一次，后续各项计算共用
+        obstacles = self._get_obstacle_columns(truth.get('obsList', []))
+        
         # 计算自车当前车道
         ego["currentLane"] = self._get_current_lane(ego)
         
+        # 前方区域每帧只构造一次，距离计算和障碍物查找共用
+        ahead_area, ahead_area_opposite = self._calculate_ahead_areas(ego, pose)
+        
         # 计算前方距离信息
-        self._calculate_ahead_distances(ego)
+        self._calculate_ahead_distances(ego, ahead_area)
         
         # 计算前方障碍物
-        self._calculate_ahead_obstacles(ego, truth)
+        self._calculate_ahead_obstacles(ego, truth, obstacles, pose, ahead_area, ahead_area_opposite)
         
         # 分类障碍物
-        truth["npcClassification"] = self._classify_obstacles(ego, truth)
+        truth["npcClassification"] = self._classify_obstacles(ego, obstacles)
         
         # 判断交通拥堵
-        ego["isTrafficJam"] = self._check_traffic_jam(ego, truth)
+        ego["isTrafficJam"] = self._check_traffic_jam(ego, obstacles)
+        
+        return obstacles
+    
+    def _get_obstacle_columns(self, obs_list: List[Dict]) -> Dict:
+        """
+        将一帧的障碍物列表按字段拆成并行的列
+        
+        Args:
+            obs_list: 障碍物列表
+        
+        Returns:
+            {"ids", "types", "lane_types", "lane_ids", "lane_turns", "dists", "speeds", "positions": 列表,
+             "thetas": 列表, "areas": 多边形object数组（缺失为None）}，各列与obs_list一一对应
+        """
+        lanes = [obs.get('currentLane', {}) for obs in obs_list]
+        areas = np.empty(len(obs_list), dtype=object)
+        areas[:] = [lane.get('area') for lane in lanes]
+        return {
+            "ids": [obs.get('id') for obs in obs_list],
+            "types": [obs.get('type') for obs in obs_list],
+            "lane_types": [lane.get('type') for lane in lanes],
+            "lane_ids": [lane.get('currentLaneId') for lane in lanes],
+            "lane_turns": [lane.get('turn', 0) for lane in lanes],
+            "dists": [obs.get('distToEgo', 200) for obs in obs_list],
+            "speeds": [obs.get('speed', 0) for obs in obs_list],
+            "positions": [(position.get('x', 0), position.get('y', 0))
+                          for position in (obs.get('position', {}) for obs in obs_list)],
+            "thetas": [obs.get('theta', 0) for obs in obs_list],
+            "areas": areas,
+        }
     
-    def _process_temporal_fields(self, trace: Dict, timestamps: List[float], current_idx: int):
-        """处理需要历史信息的字段"""
-        current_ts = timestamps[current_idx]
-        trace_point = trace[current_ts]
+    def _process_temporal_fields(self, frames: List[Tuple[float, Dict]], current_idx: int,
+                                 lane_changing: np.ndarray, turning_around: np.ndarray, pose: EgoPose,
+                                 obstacles: Dict):
+        """
+        处理需要历史信息的字段
+        
+        Args:
+            frames: 按时间排序的(timestamp, trace_point)列表
+            current_idx: 当前帧下标
+            lane_changing: 各帧是否变道，见_find_lane_changing_frames
+            turning_around: 各帧是否掉头，见_find_turning_around_frames
+            pose: 当前帧自车位姿派生量，见_get_ego_poses
+            obstacles: 当前帧障碍物的列数据，见_get_obstacle_columns
+        """
+        trace_point = frames[current_idx][1]
         ego = trace_point["ego"]
         
         # 初始化
@@ -89,18 +433,18 @@ class PostProcessor:
         ego["reach_destinaton"] = False  # 暂时设为False，需要destination坐标
         
         # 检查变道
-        if current_idx >= 10:
-            self._check_lane_changing(trace, timestamps, current_idx)
+        if current_idx >= LANE_CHANGE_WINDOW:
+            self._check_lane_changing(frames, current_idx, lane_changing)
         
         # 检查掉头
-        if current_idx >= 20:
-            self._check_turning_around(trace, timestamps, current_idx)
+        if current_idx >= TURN_AROUND_WINDOW:
+            self._check_turning_around(frames, current_idx, turning_around)
         
         # 检查优先级车辆和行人
-        self._find_priority_npcs_and_peds(trace, timestamps, current_idx)
+        self._find_priority_npcs_and_peds(frames, current_idx, obstacles, pose)
         
         # 计算高级信号（新增）
-        self._calculate_advanced_signals(trace, timestamps, current_idx)
+        self._calculate_advanced_signals(frames, current_idx, pose, obstacles)
     
     def _get_current_lane(self, ego: Dict) -> Dict:
         """获取自车当前车道信息"""
@@ -113,7 +457,9 @@ class PostProcessor:
         
         ego_area = ego.get('area')
         if ego_area is None:
-            print("警告: ego area 为 None")
+            if not self._ego_area_warning_printed:
+                logger.warning("ego area 为 None")
+                self._ego_area_warning_printed = True
             return result
         
         lane_result = self.map_info.find_which_area_the_ego_is_in(ego_area)
@@ -124,13 +470,15 @@ class PostProcessor:
             lane_count = len(self.map_info.areas["lane_areas"])
             junction_count = len(self.map_info.areas["junction_areas"])
             if lane_count == 0 and junction_count == 0:
-                print("错误: 地图数据为空！")
+                if not self._empty_map_error_printed:
+                    logger.error("地图数据为空！")
+                    self._empty_map_error_printed = True
                 return result
             
             # 不打印每个时间戳的警告，只打印一次
-            if not hasattr(self, '_lane_warning_printed'):
-                print(f"警告: 自车不在任何车道/路口内 (地图有 {lane_count} 条车道, {junction_count} 个路口)")
-                print("尝试查找最近的车道...")
+            if not self._lane_warning_printed:
+                logger.warning("自车不在任何车道/路口内 (地图有 %d 条车道, %d 个路口)，尝试查找最近的车道...",
+                               lane_count, junction_count)
                 self._lane_warning_printed = True
             
             # 尝试查找最近的车道
@@ -145,42 +493,13 @@ class PostProcessor:
                 result["currentLaneId"] = lane_result[0]["lane_id"]
                 result["type"] = 'lane'
                 
-                # 计算转向和车道数
-                forward = left = right = u_turn = 0
-                number = 0
-                for item in lane_result:
-                    number += item.get("laneNumber", 0)
-                    turn = item.get("turn", 0)
-                    if turn == 1:  # NO_TURN
-                        forward = 1
-                    elif turn == 2:  # LEFT_TURN
-                        left = 1
-                    elif turn == 3:  # RIGHT_TURN
-                        right = 1
-                    elif turn == 4:  # U_TURN
-                        u_turn = 1
-                
-                # 编码转向类型
-                if forward:
-                    if left and right:
-                        result["turn"] = 6
-                    elif left:
-                        result["turn"] = 4
-                    elif right:
-                        result["turn"] = 5
-                    else:
-                        result["turn"] = 0
-                else:
-                    if left and right:
-                        result["turn"] = 7
-                    elif left:
-                        result["turn"] = 1
-                    elif right:
-                        result["turn"] = 2
-                    elif u_turn:
-                        result["turn"] = 3
-                
-                result["number"] = number
+                # 转向和车道数只取决于命中的车道组合，按车道id缓存
+                key = tuple(item["lane_id"] for item in lane_result)
+                lane_info = self._lane_cache.get(key)
+                if lane_info is None:
+                    lane_info = self._encode_lane_turn(lane_result)
+                    self._lane_cache[key] = lane_info
+                result["turn"], result["number"] = lane_info
                 
             elif "junction_id" in lane_result[0]:
                 result["currentLaneId"] = lane_result[0]["junction_id"]
@@ -188,7 +507,76 @@ class PostProcessor:
         
         return result
     
-    def _calculate_ahead_distances(self, ego: Dict):
+    def _encode_lane_turn(self, lane_result: List[Dict]) -> Tuple[int, int]:
+        """
+        计算自车所在车道组合的转向编码和车道数
+        
+        Args:
+            lane_result: 车道查询结果列表
+        
+        Returns:
+            (转向编码, 车道数)
+        """
+        forward = left = right = u_turn = 0
+        number = 0
+        for item in lane_result:
+            number += item.get("laneNumber", 0)
+            turn = item.get("turn", 0)
+            if turn == 1:  # NO_TURN
+                forward = 1
+            elif turn == 2:  # LEFT_TURN
+                left = 1
+            elif turn == 3:  # RIGHT_TURN
+                right = 1
+            elif turn == 4:  # U_TURN
+                u_turn = 1
+        
+        # 编码转向类型
+        turn_code = 0
+        if forward:
+            if left and right:
+                turn_code = 6
+            elif left:
+                turn_code = 4
+            elif right:
+                turn_code = 5
+        else:
+            if left and right:
+                turn_code = 7
+            elif left:
+                turn_code = 1
+            elif right:
+                turn_code = 2
+            elif u_turn:
+                turn_code = 3
+        
+        return turn_code, number
+    
+    def _calculate_ahead_areas(self, ego: Dict, pose: EgoPose) -> Tuple[Optional[Polygon], Optional[Polygon]]:
+        """
+        计算自车车头前方的区域
+        
+        Args:
+            ego: 自车数据
+            pose: 自车位姿派生量
+        
+        Returns:
+            (前方区域, 对向车辆检测用的30米前方区域)，自车没有area时均为None
+        """
+        if ego.get('area') is None:
+            return None, None
+        
+        x, y = pose.head_point
+        c, s = self._get_rotation(pose.heading)
+        width = pose.width
+        # 两个区域的角点逐点旋转平移后一次构造，只有8个角点，逐点计算比构造numpy数组更快
+        rings = [[(dx * c + dy * s + x, dy * c - dx * s + y)
+                  for dx, dy in ((dist, dist), (dist, -dist), (0, -width/2), (0, width/2))]
+                 for dist in (200, 30)]
+        ahead_area, ahead_area_opposite = shapely.polygons(rings)
+        return ahead_area, ahead_area_opposite
+    
+    def _calculate_ahead_distances(self, ego: Dict, ahead_area: Optional[Polygon]):
         """计算前方各种距离"""
         ego_area = ego.get('area')
         if ego_area is None:
@@ -199,36 +587,46 @@ class PostProcessor:
             ego["junction_ahead"] = None
             return
         
-        # 计算前方区域
-        pose = ego.get('pose', {})
-        position = pose.get('position', {})
-        heading = pose.get('heading', 0)
-        size = ego.get('size', {})
-        width = size.get('width', 2.06)
-        
-        head_point = self._get_head_middle_point(
-            position.get('x', 0), position.get('y', 0),
-            heading, size.get('length', 4.7), width
-        )
-        
-        ahead_area = self._calculate_area_of_ahead(head_point, heading, width)
+        crosswalk_dist = DEFAULT_DISTANCE
+        stop_sign_dist = DEFAULT_DISTANCE
+        signal_dist = DEFAULT_DISTANCE
+        junction_id = None
+        junction_dist = math.inf
+        
+        # 一次查询得到所有与前方区域接触的地图要素，批量计算到自车的距离后按类别分发
+        hits = self._query_candidates(self._ahead_tree, ahead_area)
+        dists = shapely.distance(ego_area, [self._ahead_geoms[i] for i in hits]).tolist()
+        for i, dist in zip(hits, dists):
+            kind, item_id = self._ahead_keys[i]
+            if kind == AHEAD_CROSSWALK:
+                crosswalk_dist = min(crosswalk_dist, dist)
+            elif kind == AHEAD_JUNCTION:
+                if dist < junction_dist:
+                    junction_id, junction_dist = item_id, dist
+            elif kind == AHEAD_STOP_SIGN:
+                stop_sign_dist = min(stop_sign_dist, dist)
+            else:
+                signal_dist = min(signal_dist, dist)
         
         # 人行横道
-        ego["crosswalkAhead"] = self._distance_to_crosswalk(ego_area, ahead_area)
+        ego["crosswalkAhead"] = crosswalk_dist
         
         # 路口
-        ego["junctionAhead"], ego["junction_ahead"] = self._distance_to_junction(ego_area, ahead_area)
+        if junction_id is not None:
+            ego["junctionAhead"], ego["junction_ahead"] = junction_dist, junction_id
+        else:
+            ego["junctionAhead"], ego["junction_ahead"] = DEFAULT_DISTANCE, None
         
         # 停止标志
-        ego["stopSignAhead"] = self._distance_to_stop_sign(ego_area, ahead_area)
+        ego["stopSignAhead"] = stop_sign_dist
         
-        # 停止线（红绿灯）
-        ego["stoplineAhead"] = self._distance_to_stopline(ego_area, ahead_area, ego["stopSignAhead"])
+        # 停止线（红绿灯），同时考虑停止标志
+        ego["stoplineAhead"] = min(signal_dist, stop_sign_dist)
     
-    def _calculate_ahead_obstacles(self, ego: Dict, truth: Dict):
+    def _calculate_ahead_obstacles(self, ego: Dict, truth: Dict, obstacles: Dict, pose: EgoPose,
+                                   ahead_area: Optional[Polygon], ahead_area_opposite: Optional[Polygon]):
         """计算前方障碍物"""
         ego_area = ego.get('area')
-        obs_list = truth.get('obsList', [])
         current_lane = ego.get('currentLane', {})
         
         if ego_area is None:
@@ -237,31 +635,89 @@ class PostProcessor:
             truth["NPCOpposite"] = None
             return
         
-        # 计算前方区域
-        pose = ego.get('pose', {})
-        position = pose.get('position', {})
-        heading = pose.get('heading', 0)
-        size = ego.get('size', {})
-        width = size.get('width', 2.06)
+        heading, width = pose.heading, pose.width
         
-        head_point = self._get_head_middle_point(
-            position.get('x', 0), position.get('y', 0),
-            heading, size.get('length', 4.7), width
-        )
+        # 先在车头坐标系下用包围盒排除不可能接触前方区域的障碍物，只对剩余的调用GEOS
+        obs_areas = obstacles["areas"]
+        ahead_hits, opposite_hits = self._touching_areas(
+            [ahead_area, ahead_area_opposite], _get_ahead_extents(width), obs_areas, pose.head_point, heading)
+        
+        # 三类查找都只考虑接触区域的障碍物，只对这些障碍物计算到自车的距离，
+        # 再按距离从近到远排序（距离相同时保持原有顺序），各查找取第一个满足条件的障碍物即可
+        if len(obs_areas) < VECTORIZE_MIN_OBSTACLES:
+            # 障碍物很少时逐个计算，省去numpy数组操作的固定开销
+            touching = [k for k in range(len(obs_areas)) if ahead_hits[k] or opposite_hits[k]]
+            ego_dists = [ego_area.distance(obs_areas[k]) for k in touching]
+        else:
+            touching_index = np.flatnonzero(ahead_hits | opposite_hits)
+            ego_dists = shapely.distance(ego_area, obs_areas[touching_index]).tolist()
+            touching = touching_index.tolist()
+        ordered = [k for _, k in sorted(zip(ego_dists, touching))]
+        
+        # 前方车辆、前方行人和对向车辆在同一遍扫描中查找
+        truth["NPCAhead"], truth["PedAhead"], truth["NPCOpposite"] = self._scan_obstacles(
+            obstacles, ordered, ahead_hits, opposite_hits, current_lane, heading)
+    
+    def _touching_areas(self, areas: List[Polygon], extents: np.ndarray, obs_areas: np.ndarray,
+                        origin: tuple, heading: float) -> List[np.ndarray]:
+        """
+        批量判断各障碍物是否与各区域接触（intersects，等价于distance == 0）
         
-        ahead_area = self._calculate_area_of_ahead(head_point, heading, width)
-        ahead_area_opposite = self._calculate_area_of_ahead(head_point, heading, width, dist=30)
+        每个区域在以origin为原点、heading为x轴正方向的自车坐标系下都位于一个轴对齐矩形内，
+        障碍物多边形变换到该坐标系后，包围盒与矩形不相交的直接判为不接触，其余再交给GEOS精确计算；
+        障碍物较多时区域会先做prepare，加速同一区域对多个障碍物的重复判断
         
-        # 前方车辆
-        truth["NPCAhead"] = self._find_npc_ahead(obs_list, ahead_area, ego_area, current_lane)
+        Args:
+            areas: 区域多边形列表
+            extents: (K, 4)数组，各区域在自车坐标系下的(min_x, min_y, max_x, max_y)
+            obs_areas: 障碍物多边形数组
+            origin: 自车坐标系原点
+            heading: 自车朝向
         
-        # 前方行人
-        truth["PedAhead"] = self._find_ped_ahead(obs_list, ahead_area, ego_area)
+        Returns:
+            与areas一一对应的K个长度为N的布尔数组
+        """
+        if len(obs_areas) < LOCAL_BOUNDS_MIN_OBSTACLES:
+            # 障碍物很少时预筛选本身的开销比GEOS计算更大，直接逐区域计算
+            return [shapely.intersects(area, obs_areas) for area in areas]
+        
+        hits = np.zeros((len(areas), len(obs_areas)), dtype=bool)
+        bounds = self._get_local_bounds(obs_areas, origin, heading)
+        tol = LOCAL_BOUNDS_TOLERANCE
+        candidates = ((bounds[2] >= extents[:, 0, None] - tol) & (bounds[0] <= extents[:, 2, None] + tol) &
+                      (bounds[3] >= extents[:, 1, None] - tol) & (bounds[1] <= extents[:, 3, None] + tol))
+        for k, area in enumerate(areas):
+            mask = candidates[k]
+            if mask.any():
+                shapely.prepare(area)
+                hits[k, mask] = shapely.intersects(area, obs_areas[mask])
+        return list(hits)
+    
+    def _get_local_bounds(self, obs_areas: np.ndarray, origin: tuple, heading: float) -> np.ndarray:
+        """
+        将障碍物多边形顶点变换到自车坐标系
         
-        # 对向车辆
-        truth["NPCOpposite"] = self._find_npc_opposite(obs_list, ahead_area_opposite, ego_area, heading)
+        Returns:
+            (4, N)数组，各行依次为障碍物在该坐标系下的min_x, min_y, max_x, max_y，缺失的障碍物为NaN
+        """
+        bounds = np.full((4, len(obs_areas)), np.nan)
+        coords, index = shapely.get_coordinates(obs_areas, return_index=True)
+        if len(coords) > 0:
+            c, s = math.cos(heading), math.sin(heading)
+            dx = coords[:, 0] - origin[0]
+            dy = coords[:, 1] - origin[1]
+            local_x = dx * c + dy * s
+            local_y = dy * c - dx * s
+            # 顶点按障碍物顺序排列，按分组起点做归约
+            starts = np.flatnonzero(np.diff(index, prepend=-1))
+            owners = index[starts]
+            bounds[0, owners] = np.minimum.reduceat(local_x, starts)
+            bounds[1, owners] = np.minimum.reduceat(local_y, starts)
+            bounds[2, owners] = np.maximum.reduceat(local_x, starts)
+            bounds[3, owners] = np.maximum.reduceat(local_y, starts)
+        return bounds
     
-    def _classify_obstacles(self, ego: Dict, truth: Dict) -> Dict:
+    def _classify_obstacles(self, ego: Dict, obstacles: Dict) -> Dict:
         """分类障碍物"""
         result = {
             "NextToEgo": [],
@@ -272,433 +728,299 @@ class PostProcessor:
         }
         
         ego_lane = ego.get('currentLane', {})
-        obs_list = truth.get('obsList', [])
+        ego_lane_type = ego_lane.get('type')
+        ego_lane_id = ego_lane.get("currentLaneId")
+        if ego_lane_type not in ('lane', 'junction'):
+            return result
         
-        for obs in obs_list:
-            obs_lane = obs.get('currentLane', {})
-            temp = {"name": obs.get("id", "unknown")}
+        for obs_id, lane_type, lane_id, turn in zip(obstacles["ids"], obstacles["lane_types"],
+                                                    obstacles["lane_ids"], obstacles["lane_turns"]):
+            temp = {"name": "unknown" if obs_id is None else obs_id}
             
-            if ego_lane.get('type') == 'lane':
-                if obs_lane.get('type') == 'lane':
-                    temp["laneId"] = obs_lane.get("currentLaneId")
-                    temp["turn"] = obs_lane.get("turn", 0)
-                    temp["type"] = "lane"
-                    
-                    if self.map_info.check_whether_two_lanes_are_in_the_same_road(
-                        ego_lane.get("currentLaneId"), obs_lane.get("currentLaneId")
-                    ):
-                        result["NextToEgo"].append(temp)
-                    else:
-                        result["OntheDifferentRoad"].append(temp)
-                        
-                elif obs_lane.get('type') == 'junction':
-                    temp["junctionId"] = obs_lane.get("currentLaneId")
-                    temp["type"] = "junction"
-                    result["IntheJunction"].append(temp)
-                    
-            elif ego_lane.get('type') == 'junction':
-                if obs_lane.get('type') == 'lane':
-                    temp["laneId"] = obs_lane.get("currentLaneId")
-                    temp["turn"] = obs_lane.get("turn", 0)
-                    temp["type"] = "lane"
+            if lane_type == 'lane':
+                temp["laneId"] = lane_id
+                temp["turn"] = turn
+                temp["type"] = "lane"
+                
+                if ego_lane_type == 'junction':
                     result["EgoInjunction_Lane"].append(temp)
-                    
-                elif obs_lane.get('type') == 'junction':
-                    temp["junctionId"] = obs_lane.get("currentLaneId")
-                    temp["type"] = "junction"
+                elif self._same_road(ego_lane_id, lane_id):
+                    result["NextToEgo"].append(temp)
+                else:
+                    result["OntheDifferentRoad"].append(temp)
+            
+            elif lane_type == 'junction':
+                temp["junctionId"] = lane_id
+                temp["type"] = "junction"
+                
+                if ego_lane_type == 'junction':
                     result["EgoInjunction_junction"].append(temp)
+                else:
+                    result["IntheJunction"].append(temp)
         
         return result
     
-    def _check_traffic_jam(self, ego: Dict, truth: Dict) -> bool:
+    def _same_road(self, lane_1: Optional[str], lane_2: Optional[str]) -> bool:
+        """带缓存的check_whether_two_lanes_are_in_the_same_road，该判断与参数顺序无关"""
+        key = (lane_1, lane_2)
+        result = self._same_road_cache.get(key)
+        if result is None:
+            result = self.map_info.check_whether_two_lanes_are_in_the_same_road(lane_1, lane_2)
+            self._same_road_cache[key] = result
+            self._same_road_cache[(lane_2, lane_1)] = result
+        return result
+    
+    def _check_traffic_jam(self, ego: Dict, obstacles: Dict) -> bool:
         """检查是否交通拥堵"""
         junction_ahead = ego.get('junction_ahead')
         if junction_ahead is None:
             return False
         
-        obs_list = truth.get('obsList', [])
         count = 0
         
-        for obs in obs_list:
-            if obs.get('speed', 0) < 1 and obs.get('type') == 'VEHICLE':
-                obs_lane = obs.get('currentLane', {})
-                if obs_lane.get('type') == 'junction':
-                    if obs_lane.get('currentLaneId') == junction_ahead:
-                        count += 1
+        for obs_type, speed, lane_type, lane_id in zip(obstacles["types"], obstacles["speeds"],
+                                                       obstacles["lane_types"], obstacles["lane_ids"]):
+            if speed < 1 and obs_type == 'VEHICLE':
+                if lane_type == 'junction' and lane_id == junction_ahead:
+                    count += 1
         
         return count >= 6
     
-    def _check_lane_changing(self, trace: Dict, timestamps: List[float], current_idx: int):
-        """检查是否正在变道"""
-        current_ts = timestamps[current_idx]
-        prev_ts = timestamps[current_idx - 10]
-        
-        current_ego = trace[current_ts]["ego"]
-        prev_ego = trace[prev_ts]["ego"]
+    def _check_lane_changing(self, frames: List[Tuple[float, Dict]], current_idx: int,
+                             lane_changing: np.ndarray):
+        """检查是否正在变道，结果写回LANE_CHANGE_WINDOW帧之前的自车"""
+        prev_idx = current_idx - LANE_CHANGE_WINDOW
+        if lane_changing[prev_idx]:
+            frames[prev_idx][1]["ego"]["isLaneChanging"] = True
+    
+    def _check_turning_around(self, frames: List[Tuple[float, Dict]], current_idx: int,
+                              turning_around: np.ndarray):
+        """检查是否正在掉头，结果写回TURN_AROUND_WINDOW帧之前的自车"""
+        prev_idx = current_idx - TURN_AROUND_WINDOW
+        if turning_around[prev_idx]:
+            frames[prev_idx][1]["ego"]["isTurningAround"] = True
+    
+    def _find_lane_changing_frames(self, egos: List[Dict]) -> np.ndarray:
+        """
+        批量判断各帧是否变道
         
-        if prev_ego.get("isLaneChanging", False):
-            return
+        某帧有转向规划，且其后LANE_CHANGE_WINDOW帧内出现同一道路上的其他车道时判为变道
         
-        prev_lane = prev_ego.get("currentLane", {})
-        prev_lane_id = prev_lane.get("currentLaneId")
-        prev_turn = prev_ego.get("planning_of_turn", 0)
+        Args:
+            egos: 按时间排序的自车数据列表
         
-        if prev_turn == 0:
-            return
+        Returns:
+            布尔数组，最后LANE_CHANGE_WINDOW帧之后没有足够的帧，恒为False
+        """
+        n = len(egos)
+        result = np.zeros(n, dtype=bool)
+        count = n - LANE_CHANGE_WINDOW
+        if count <= 0:
+            return result
         
-        # 检查后续10个时间戳
-        for i in range(current_idx - 10 + 1, min(current_idx + 1, len(timestamps))):
-            ts = timestamps[i]
-            ego = trace[ts]["ego"]
-            current_lane_id = ego.get("currentLane", {}).get("currentLaneId")
-            
-            if current_lane_id != prev_lane_id and current_lane_id is not None:
-                in_same_road = self.map_info.check_whether_two_lanes_are_in_the_same_road(
-                    prev_lane_id, current_lane_id
-                )
-                if in_same_road:
-                    prev_ego["isLaneChanging"] = True
-                    break
+        # 同一道路的判断只需比较车道所属的道路id，对整条轨迹一次性查表
+        lane_to_road = self.map_info.lane_to_road
+        lane_ids = np.empty(n, dtype=object)
+        lane_ids[:] = [ego.get("currentLane", {}).get("currentLaneId") for ego in egos]
+        road_ids = np.empty(n, dtype=object)
+        road_ids[:] = [lane_to_road.get(lane_id) for lane_id in lane_ids]
+        has_lane = np.fromiter((lane_id is not None for lane_id in lane_ids), dtype=bool, count=n)
+        has_road = np.fromiter((road_id is not None for road_id in road_ids), dtype=bool, count=n)
+        turning = np.fromiter((ego.get("planning_of_turn", 0) != 0 for ego in egos), dtype=bool, count=n)
+        
+        prev_ids = lane_ids[:count]
+        prev_roads = road_ids[:count]
+        for offset in range(1, LANE_CHANGE_WINDOW + 1):
+            window = slice(offset, count + offset)
+            result[:count] |= (lane_ids[window] != prev_ids) & has_lane[window] & (road_ids[window] == prev_roads)
+        result[:count] &= turning[:count] & has_road[:count]
+        return result
     
-    def _check_turning_around(self, trace: Dict, timestamps: List[float], current_idx: int):
-        """检查是否正在掉头"""
-        current_ts = timestamps[current_idx]
-        prev_ts = timestamps[current_idx - 20]
+    def _find_turning_around_frames(self, egos: List[Dict], poses: List[EgoPose]) -> np.ndarray:
+        """
+        批量判断各帧是否掉头
         
-        current_ego = trace[current_ts]["ego"]
-        prev_ego = trace[prev_ts]["ego"]
+        某帧有转向规划，且其后TURN_AROUND_WINDOW帧内航向变化超过3π/4时判为掉头
         
-        prev_heading = prev_ego.get("pose", {}).get("heading", 0)
-        prev_heading = self._normalize_angle(prev_heading)
-        prev_turn = prev_ego.get("planning_of_turn", 0)
+        Args:
+            egos: 按时间排序的自车数据列表
+            poses: 与egos对应的自车位姿派生量，见_get_ego_poses
         
-        if prev_turn == 0:
-            return
+        Returns:
+            布尔数组，最后TURN_AROUND_WINDOW帧之后没有足够的帧，恒为False
+        """
+        n = len(poses)
+        result = np.zeros(n, dtype=bool)
+        count = n - TURN_AROUND_WINDOW
+        if count <= 0:
+            return result
         
-        # 检查后续20个时间戳
-        for i in range(current_idx - 20 + 1, min(current_idx + 1, len(timestamps))):
-            ts = timestamps[i]
-            ego = trace[ts]["ego"]
-            current_heading = ego.get("pose", {}).get("heading", 0)
-            current_heading = self._normalize_angle(current_heading)
-            
-            if abs(current_heading - prev_heading) > 3 * math.pi / 4:
-                prev_ego["isTurningAround"] = True
-                break
+        headings = np.fromiter((pose.heading for pose in poses), dtype=np.float64, count=n)
+        headings = np.where(headings < 0, headings + 2 * math.pi, headings)
+        turning = np.fromiter((ego.get("planning_of_turn", 0) != 0 for ego in egos), dtype=bool, count=n)
+        
+        prev_headings = headings[:count]
+        for offset in range(1, TURN_AROUND_WINDOW + 1):
+            result[:count] |= np.abs(headings[offset:count + offset] - prev_headings) > 3 * math.pi / 4
+        result[:count] &= turning[:count]
+        return result
     
-    def _find_priority_npcs_and_peds(self, trace: Dict, timestamps: List[float], current_idx: int):
-        """查找优先级车辆和行人"""
-        current_ts = timestamps[current_idx]
-        ego = trace[current_ts]["ego"]
-        truth = trace[current_ts]["truth"]
+    def _find_priority_npcs_and_peds(self, frames: List[Tuple[float, Dict]], current_idx: int, obstacles: Dict,
+                                     pose: EgoPose):
+        """
+        查找优先级车辆和行人
+        
+        Args:
+            frames: 按时间排序的(timestamp, trace_point)列表
+            current_idx: 当前帧下标
+            obstacles: 当前帧障碍物的列数据
+            pose: 当前帧自车位姿派生量
+        """
+        trace_point = frames[current_idx][1]
+        ego = trace_point["ego"]
+        truth = trace_point["truth"]
         
         ego_area = ego.get('area')
         if ego_area is None:
             return
         
-        pose = ego.get('pose', {})
-        position = pose.get('position', {})
-        heading = pose.get('heading', 0)
-        size = ego.get('size', {})
+        # 所有判定分支都要求障碍物到自车的距离小于PRIORITY_MAX_DIST，先按距离排除，
+        # 附近没有障碍物时无需构造各区域多边形
+        nearby = [i for i, (dist, area) in enumerate(zip(obstacles["dists"], obstacles["areas"]))
+                  if dist < PRIORITY_MAX_DIST and area is not None]
+        if not nearby:
+            return
         
-        back_point = self._get_back_middle_point(
-            position.get('x', 0), position.get('y', 0),
-            heading, size.get('length', 4.7), size.get('width', 2.06)
-        )
+        back_point, heading, width = pose.back_point, pose.heading, pose.width
         
-        ahead_area = self._calculate_area_of_ahead2(back_point, heading)
-        left_area = self._calculate_area_of_ahead_left(back_point, heading)
-        right_area = self._calculate_area_of_ahead_right(back_point, heading)
-        back_left = self._calculate_area_of_back_left(back_point, heading, size.get('width', 2.06))
-        back_right = self._calculate_area_of_back_right(back_point, heading, size.get('width', 2.06))
+        sector_corners, extents = _get_priority_sector_geometry(width)
+        priority_areas = self._calculate_priority_areas(back_point, self._get_rotation(heading), sector_corners)
         
-        obs_list = truth.get('obsList', [])
         planning_turn = ego.get('planning_of_turn', 0)
         is_lane_changing = ego.get('isLaneChanging', False)
         
-        for obs in obs_list:
-            obs_area = obs.get('currentLane', {}).get('area')
-            if obs_area is None:
-                continue
-            
-            obs_type = obs.get('type')
-            dist = obs.get('distToEgo', 200)
+        # 各区域与所有障碍物的接触情况一次性批量计算
+        # 各区域在车尾坐标系下都位于一个轴对齐矩形内，先用包围盒排除，只对剩余障碍物调用GEOS
+        obs_areas = obstacles["areas"][nearby]
+        in_ahead, in_left, in_right, in_back_left, in_back_right = self._touching_areas(
+            priority_areas, extents, obs_areas, back_point, heading)
+        thetas = obstacles["thetas"]
+        headings = classify_heading([thetas[k] for k in nearby], heading)
+        npc_ahead = truth.get('NPCAhead')
+        
+        for i, k in enumerate(nearby):
+            obs_type = obstacles["types"][k]
+            dist = obstacles["dists"][k]
             
             # 检查前方车辆
-            if truth.get('NPCAhead') == obs.get('id') and dist < 3:
+            if npc_ahead == obstacles["ids"][k] and dist < 3:
                 ego['PriorityNPCAhead'] = True
             
             if obs_type == 'VEHICLE':
-                obs_heading = self._normalize_angle(obs.get('theta', 0))
-                ego_heading = self._normalize_angle(heading)
-                heading_diff = abs(obs_heading - ego_heading)
-                
                 # 转向时的优先级判定
                 if planning_turn != 0 and not is_lane_changing:
-                    if math.pi/4 < heading_diff < 3*math.pi/4:
-                        if dist < 30 and ahead_area.distance(obs_area) == 0:
+                    if headings[i] == HEADING_PERPENDICULAR:
+                        if dist < 30 and in_ahead[i]:
                             ego['PriorityNPCAhead'] = True
                 
                 # 变道时的优先级判定
-                if is_lane_changing and heading_diff < math.pi/4:
-                    ego_speed = self._get_ego_speed(ego)
-                    obs_speed = obs.get('speed', 0)
+                if is_lane_changing and headings[i] == HEADING_SAME:
+                    obs_speed = obstacles["speeds"][k]
                     
-                    if planning_turn == 1 and back_left.distance(obs_area) == 0:
-                        if dist < 10 and obs_speed > ego_speed:
+                    if planning_turn == 1 and in_back_left[i]:
+                        if dist < 10 and obs_speed > pose.speed:
                             ego['PriorityNPCAhead'] = True
                     
-                    if planning_turn == 2 and back_right.distance(obs_area) == 0:
-                        if dist < 10 and obs_speed > ego_speed:
+                    if planning_turn == 2 and in_back_right[i]:
+                        if dist < 10 and obs_speed > pose.speed:
                             ego['PriorityNPCAhead'] = True
             
             elif obs_type == 'PEDESTRIAN':
-                if planning_turn == 0 and dist < 3 and ahead_area.distance(obs_area) == 0:
+                if planning_turn == 0 and dist < 3 and in_ahead[i]:
                     ego['PriorityPedsAhead'] = True
-                elif planning_turn == 1 and dist < 10 and left_area.distance(obs_area) == 0:
+                elif planning_turn == 1 and dist < 10 and in_left[i]:
                     ego['PriorityPedsAhead'] = True
-                elif planning_turn == 2 and dist < 10 and right_area.distance(obs_area) == 0:
+                elif planning_turn == 2 and dist < 10 and in_right[i]:
                     ego['PriorityPedsAhead'] = True
     
     # 辅助几何计算方法
-    def _get_head_middle_point(self, x: float, y: float, heading: float, length: float, width: float) -> tuple:
-        """获取车头中点"""
-        wheelbase = 2.697298
-        dx = (length - wheelbase) / 2 + wheelbase
-        
-        rotated_x = dx * math.cos(heading)
-        rotated_y = dx * math.sin(heading)
-        
-        return (x + rotated_x, y + rotated_y)
-    
-    def _get_back_middle_point(self, x: float, y: float, heading: float, length: float, width: float) -> tuple:
-        """获取车尾中点"""
-        wheelbase = 2.697298
-        dx = -(length - wheelbase) / 2
-        
-        rotated_x = dx * math.cos(heading)
-        rotated_y = dx * math.sin(heading)
-        
-        return (x + rotated_x, y + rotated_y)
-    
-    def _calculate_area_of_ahead(self, point: tuple, heading: float, width: float, dist: float = 200) -> Polygon:
-        """计算前方区域"""
-        x, y = point
-        points = []
-        
-        # 四个角点
-        corners = [
-            (x + dist, y + dist),
-            (x + dist, y - dist),
-            (x, y - width/2),
-            (x, y + width/2)
-        ]
-        
-        for cx, cy in corners:
-            rx = (cx - x) * math.cos(-heading) + (cy - y) * math.sin(-heading) + x
-            ry = (cy - y) * math.cos(-heading) - (cx - x) * math.sin(-heading) + y
-            points.append((rx, ry))
-        
-        return Polygon(points)
-    
-    def _calculate_area_of_ahead2(self, point: tuple, heading: float) -> Polygon:
-        """计算前方大区域"""
-        return self._calculate_area_of_ahead(point, heading, 200, 200)
-    
-    def _calculate_area_of_ahead_left(self, point: tuple, heading: float) -> Polygon:
-        """计算左前方区域"""
-        x, y = point
-        points = []
-        corners = [(x + 30, y), (x + 30, y - 30), (x, y - 30), (x, y)]
-        
-        for cx, cy in corners:
-            rx = (cx - x) * math.cos(-heading) + (cy - y) * math.sin(-heading) + x
-            ry = (cy - y) * math.cos(-heading) - (cx - x) * math.sin(-heading) + y
-            points.append((rx, ry))
-        
-        return Polygon(points)
-    
-    def _calculate_area_of_ahead_right(self, point: tuple, heading: float) -> Polygon:
-        """计算右前方区域"""
-        x, y = point
-        points = []
-        corners = [(x + 30, y + 30), (x + 30, y), (x, y), (x, y + 30)]
-        
-        for cx, cy in corners:
-            rx = (cx - x) * math.cos(-heading) + (cy - y) * math.sin(-heading) + x
-            ry = (cy - y) * math.cos(-heading) - (cx - x) * math.sin(-heading) + y
-            points.append((rx, ry))
-        
-        return Polygon(points)
+    def _get_rotation(self, heading: float) -> Tuple[float, float]:
+        """区域角点旋转所用的(cos(-heading), sin(-heading))，同一帧的各区域共用"""
+        return math.cos(-heading), math.sin(-heading)
     
-    def _calculate_area_of_back_left(self, point: tuple, heading: float, width: float) -> Polygon:
-        """计算左后方区域"""
-        x, y = point
-        points = []
-        offset = width/2 + 0.3
-        corners = [(x, y - offset), (x, y - offset - 3), (x - 30, y - offset - 3), (x - 30, y - offset)]
+    def _calculate_priority_areas(self, point: tuple, rotation: Tuple[float, float],
+                                  corners: List[List[List[float]]]) -> np.ndarray:
+        """
+        一次构造优先级判定用的五个区域：前方大区域、左前方、右前方、左后方、右后方
         
-        for cx, cy in corners:
-            rx = (cx - x) * math.cos(-heading) + (cy - y) * math.sin(-heading) + x
-            ry = (cy - y) * math.cos(-heading) - (cx - x) * math.sin(-heading) + y
-            points.append((rx, ry))
+        Args:
+            point: 自车车尾中点
+            rotation: _get_rotation的结果
+            corners: 各区域在车尾坐标系下的角点，见_get_priority_sector_geometry
         
-        return Polygon(points)
-    
-    def _calculate_area_of_back_right(self, point: tuple, heading: float, width: float) -> Polygon:
-        """计算右后方区域"""
+        Returns:
+            5个多边形组成的数组，顺序同上
+        """
         x, y = point
-        points = []
-        offset = width/2 + 0.3
-        corners = [(x, y + offset + 3), (x, y + offset), (x - 30, y + offset), (x - 30, y + offset + 3)]
-        
-        for cx, cy in corners:
-            rx = (cx - x) * math.cos(-heading) + (cy - y) * math.sin(-heading) + x
-            ry = (cy - y) * math.cos(-heading) - (cx - x) * math.sin(-heading) + y
-            points.append((rx, ry))
-        
-        return Polygon(points)
-    
-    def _distance_to_crosswalk(self, ego_area: Polygon, ahead_area: Polygon) -> float:
-        """计算到人行横道的距离"""
-        crosswalks = self.map_info.get_crosswalk_config()
-        min_dist = DEFAULT_DISTANCE
-        
-        for cw_area in crosswalks.values():
-            if ahead_area.distance(cw_area) == 0:
-                dist = ego_area.distance(cw_area)
-                min_dist = min(min_dist, dist)
-        
-        return min_dist
-    
-    def _distance_to_junction(self, ego_area: Polygon, ahead_area: Polygon) -> tuple:
-        """计算到路口的距离"""
-        junctions = self.map_info.areas["junction_areas"]
-        result = {}
-        
-        for junc_id, junc_area in junctions.items():
-            if ahead_area.distance(junc_area) == 0:
-                result[junc_id] = ego_area.distance(junc_area)
-        
-        if result:
-            nearest_id = min(result.keys(), key=lambda k: result[k])
-            return result[nearest_id], nearest_id
-        
-        return DEFAULT_DISTANCE, None
-    
-    def _distance_to_stop_sign(self, ego_area: Polygon, ahead_area: Polygon) -> float:
-        """计算到停止标志的距离"""
-        signs = self.map_info.get_traffic_sign()
-        min_dist = DEFAULT_DISTANCE
-        
-        for sign in signs:
-            stop_line = sign.get("stop_line")
-            if stop_line and ahead_area.distance(stop_line) == 0:
-                dist = ego_area.distance(stop_line)
-                min_dist = min(min_dist, dist)
-        
-        return min_dist
-    
-    def _distance_to_stopline(self, ego_area: Polygon, ahead_area: Polygon, stop_sign_dist: float) -> float:
-        """计算到停止线的距离"""
-        signals = self.map_info.get_traffic_signals()
-        min_dist = DEFAULT_DISTANCE
-        
-        for signal in signals:
-            stop_line = signal.get("stop_line")
-            if stop_line and ahead_area.distance(stop_line) == 0:
-                dist = ego_area.distance(stop_line)
-                min_dist = min(min_dist, dist)
-        
-        return min(min_dist, stop_sign_dist)
+        c, s = rotation
+        # 只有20个角点，逐点旋转平移比numpy数组运算更快，再一次构造为5个多边形
+        return shapely.polygons([[(dx * c + dy * s + x, dy * c - dx * s + y) for dx, dy in ring]
+                                 for ring in corners])
     
-    def _find_npc_ahead(self, obs_list: List, ahead_area: Polygon, ego_area: Polygon, current_lane: Dict) -> Optional[str]:
-        """查找前方车辆"""
-        candidates = {}
-        
-        for obs in obs_list:
-            if obs.get('type') != 'VEHICLE':
-                continue
-            
-            obs_area = obs.get('currentLane', {}).get('area')
-            if obs_area is None or ahead_area.distance(obs_area) != 0:
-                continue
-            
-            obs_lane = obs.get('currentLane', {})
-            
-            if current_lane.get('type') == 'lane':
-                if obs_lane.get('type') == 'lane' and \
-                   obs_lane.get('currentLaneId') == current_lane.get('currentLaneId'):
-                    candidates[obs['id']] = ego_area.distance(obs_area)
-            elif current_lane.get('type') == 'junction':
-                candidates[obs['id']] = ego_area.distance(obs_area)
-        
-        return min(candidates.keys(), key=lambda k: candidates[k]) if candidates else None
-    
-    def _find_ped_ahead(self, obs_list: List, ahead_area: Polygon, ego_area: Polygon) -> Optional[str]:
-        """查找前方行人"""
-        candidates = {}
-        
-        for obs in obs_list:
-            if obs.get('type') != 'PEDESTRIAN':
-                continue
-            
-            obs_area = obs.get('currentLane', {}).get('area')
-            if obs_area is None or ahead_area.distance(obs_area) != 0:
-                continue
-            
-            candidates[obs['id']] = ego_area.distance(obs_area)
+    def _scan_obstacles(self, obstacles: Dict, ordered: List[int], ahead_hits: np.ndarray,
+                        opposite_hits: np.ndarray, current_lane: Dict,
+                        ego_heading: float) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        一遍扫描同时查找前方车辆、前方行人和对向车辆
         
-        return min(candidates.keys(), key=lambda k: candidates[k]) if candidates else None
-    
-    def _find_npc_opposite(self, obs_list: List, ahead_area: Polygon, ego_area: Polygon, ego_heading: float) -> Optional[str]:
-        """查找对向车辆"""
-        candidates = {}
-        ego_heading = self._normalize_angle(ego_heading)
+        Args:
+            obstacles: 障碍物列数据
+            ordered: 与前方区域接触的障碍物下标，按到自车的距离从近到远排列
+            ahead_hits: 各障碍物是否与前方区域接触
+            opposite_hits: 各障碍物是否与对向车辆检测区域接触
+            current_lane: 自车当前车道
+            ego_heading: 自车航向角
         
-        for obs in obs_list:
-            if obs.get('type') != 'VEHICLE':
-                continue
-            
-            obs_area = obs.get('currentLane', {}).get('area')
-            if obs_area is None or ahead_area.distance(obs_area) != 0:
-                continue
-            
-            obs_heading = self._normalize_angle(obs.get('theta', 0))
-            heading_diff = abs(obs_heading - ego_heading)
-            
-            if 3*math.pi/4 < heading_diff < 5*math.pi/4:
-                candidates[obs['id']] = ego_area.distance(obs_area)
+        Returns:
+            (前方车辆id, 前方行人id, 对向车辆id)，各自取满足条件的最近障碍物，没有时为None
+        """
+        ego_lane_type = current_lane.get('type')
+        ego_lane_id = current_lane.get('currentLaneId')
+        
+        # 自车不在车道/路口内时不查找前方车辆
+        npc_ahead, ped_ahead, npc_opposite = None, None, None
+        need_npc = ego_lane_type in ('lane', 'junction')
+        need_ped = need_opposite = True
+        
+        ids, types = obstacles["ids"], obstacles["types"]
+        lane_types, lane_ids = obstacles["lane_types"], obstacles["lane_ids"]
+        thetas = obstacles["thetas"]
+        headings = classify_heading([thetas[k] for k in ordered], ego_heading)
+        for k, code in zip(ordered, headings):
+            if types[k] == 'VEHICLE':
+                if need_npc and ahead_hits[k] and (
+                        ego_lane_type == 'junction' or (lane_types[k] == 'lane' and lane_ids[k] == ego_lane_id)):
+                    npc_ahead, need_npc = ids[k], False
+                if need_opposite and opposite_hits[k] and code == HEADING_OPPOSITE:
+                    npc_opposite, need_opposite = ids[k], False
+            elif types[k] == 'PEDESTRIAN':
+                if need_ped and ahead_hits[k]:
+                    ped_ahead, need_ped = ids[k], False
+            if not (need_npc or need_ped or need_opposite):
+                break
         
-        return min(candidates.keys(), key=lambda k: candidates[k]) if candidates else None
-    
-    def _normalize_angle(self, angle: float) -> float:
-        """归一化角度到[0, 2π)"""
-        if angle < 0:
-            return angle + 2 * math.pi
-        return angle
+        return npc_ahead, ped_ahead, npc_opposite
     
     def _find_nearest_lane(self, ego_area: Polygon) -> Optional[Dict]:
         """查找最近的车道"""
-        min_dist = float('inf')
-        nearest_lane_id = None
-        
-        # 先检查车道
-        for lane_id, area in self.map_info.areas["lane_areas"].items():
-            dist = ego_area.distance(area)
-            if dist < min_dist:
-                min_dist = dist
-                nearest_lane_id = lane_id
-        
-        # 再检查路口
-        for junction_id, area in self.map_info.areas["junction_areas"].items():
-            dist = ego_area.distance(area)
-            if dist < min_dist:
-                min_dist = dist
-                nearest_lane_id = junction_id
+        # 通过地图的空间索引直接找到距离最近的车道/路口，超出阈值的要素不会被采用
+        nearest = self.map_info.find_nearest_area(ego_area, NEAREST_LANE_MAX_DIST)
+        if nearest is None:
+            return None
+        nearest_lane_id, min_dist = nearest
         
         # 如果距离小于5米，认为基本在该车道上
-        if nearest_lane_id and min_dist < 5.0:
+        if nearest_lane_id and min_dist < NEAREST_LANE_MAX_DIST:
             if nearest_lane_id in self.map_info.areas["lane_areas"]:
                 return {
                     "currentLaneId": nearest_lane_id,
@@ -716,28 +1038,102 @@ class PostProcessor:
         
         return None
     
-    def _get_ego_speed(self, ego: Dict) -> float:
-        """获取自车速度"""
-        vel = ego.get('pose', {}).get('linearVelocity', {})
-        vx = vel.get('x', 0)
-        vy = vel.get('y', 0)
-        return math.sqrt(vx*vx + vy*vy)
+    def _get_ego_poses(self, egos: List[Dict], timestamps: List[float]) -> List[EgoPose]:
+        """
+        批量提取各帧自车的车头中点、车尾中点、航向、车宽、速度、加速度和强制制动标志
+        
+        Args:
+            egos: 按时间排序的自车数据列表
+            timestamps: 与egos对应的时间戳
+        
+        Returns:
+            EgoPose列表，与egos一一对应
+        """
+        n = len(egos)
+        poses = [ego.get('pose', {}) for ego in egos]
+        positions = [pose.get('position', {}) for pose in poses]
+        velocities = [pose.get('linearVelocity', {}) for pose in poses]
+        
+        xs = np.fromiter((position.get('x', 0) for position in positions), dtype=np.float64, count=n)
+        ys = np.fromiter((position.get('y', 0) for position in positions), dtype=np.float64, count=n)
+        headings = np.fromiter((pose.get('heading', 0) for pose in poses), dtype=np.float64, count=n)
+        sizes = [ego.get('size', {}) for ego in egos]
+        lengths = np.fromiter((size.get('length', 4.7) for size in sizes), dtype=np.float64, count=n)
+        vxs = np.fromiter((vel.get('x', 0) for vel in velocities), dtype=np.float64, count=n)
+        vys = np.fromiter((vel.get('y', 0) for vel in velocities), dtype=np.float64, count=n)
+        
+        cos_h = np.cos(headings)
+        sin_h = np.sin(headings)
+        wheelbase = EGO_VEHICLE['wheelbase']
+        # 车头中点在中心前方(length - wheelbase) / 2 + wheelbase处，车尾中点在中心后方(length - wheelbase) / 2处
+        head_dx = (lengths - wheelbase) / 2 + wheelbase
+        back_dx = -(lengths - wheelbase) / 2
+        
+        head_points = zip((xs + head_dx * cos_h).tolist(), (ys + head_dx * sin_h).tolist())
+        back_points = zip((xs + back_dx * cos_h).tolist(), (ys + back_dx * sin_h).tolist())
+        widths = (size.get('width', 2.06) for size in sizes)
+        speeds = np.hypot(vxs, vys)
+        speed_list = speeds.tolist()
+        accels = self._get_accelerations(speeds, timestamps)
+        
+        # HardBrake只依赖加速度和制动踏板，整条轨迹一次比较
+        brake_percentages = np.fromiter((ego.get("Chassis", {}).get("brakePercentage", 0) for ego in egos),
+                                        dtype=np.float64, count=n)
+        hard_brakes = ((np.asarray(accels, dtype=np.float64) < self._hard_brake_accel) |
+                       (brake_percentages > self._hard_brake_percentage))
+        
+        return list(map(EgoPose, head_points, back_points, headings.tolist(), widths, speed_list, accels,
+                        self._get_stopped_durations(speed_list, timestamps), hard_brakes.tolist()))
+    
+    def _get_accelerations(self, speeds: np.ndarray, timestamps: List[float]) -> List[float]:
+        """
+        由相邻帧的速度差和时间差计算各帧的纵向加速度
+        
+        Returns:
+            与speeds对应的加速度列表，首帧和时间戳不递增的帧为0
+        """
+        if len(speeds) == 0:
+            return []
+        dts = np.diff(np.asarray(timestamps))
+        valid = dts > 0
+        accels = np.zeros(len(dts))
+        np.divide(np.diff(speeds), dts, out=accels, where=valid)
+        return [0] + [accel if ok else 0 for accel, ok in zip(accels.tolist(), valid.tolist())]
+    
+    def _get_stopped_durations(self, speeds: List[float], timestamps: List[float]) -> List[float]:
+        """
+        计算各帧截至当前连续静止的时长：静止时累加相邻帧的时间差，运动时清零，首帧为0
+        
+        该递推逐帧依赖上一帧的结果，对整条轨迹单独循环一次
+        """
+        durations = []
+        duration = 0
+        prev_ts = None
+        stopped_threshold = self._stopped_velocity
+        for ts, speed in zip(timestamps, speeds):
+            if prev_ts is not None and speed < stopped_threshold:
+                duration = duration + (ts - prev_ts)
+            else:
+                duration = 0
+            durations.append(duration)
+            prev_ts = ts
+        return durations
     
     # ========== 以下是新增的后处理信号 ==========
     
-    def _calculate_advanced_signals(self, trace: Dict, timestamps: List[float], current_idx: int):
+    def _calculate_advanced_signals(self, frames: List[Tuple[float, Dict]], current_idx: int, pose: EgoPose,
+                                    obstacles: Dict):
         """计算高级信号（需要在_process_temporal_fields中调用）"""
-        current_ts = timestamps[current_idx]
-        trace_point = trace[current_ts]
+        trace_point = frames[current_idx][1]
         ego = trace_point["ego"]
         truth = trace_point["truth"]
         traffic_lights = trace_point.get("traffic_lights", {})
         
         # 一、纵向基础信号
-        self._calculate_longitudinal_signals(ego, truth)
+        self._calculate_longitudinal_signals(ego, truth, pose.speed, obstacles)
         
         # 二、纵向动作&制动
-        self._calculate_braking_signals(trace, timestamps, current_idx)
+        self._calculate_braking_signals(frames, current_idx, pose.accel, pose.hard_brake)
         
         # 三、横向/车道相关
         self._calculate_lateral_signals(ego, truth)
@@ -746,35 +1142,32 @@ class PostProcessor:
         self._calculate_traffic_control_signals(ego, traffic_lights)
         
         # 五、人行横道/行人相关
-        self._calculate_crosswalk_signals(ego, truth)
+        self._calculate_crosswalk_signals(ego, obstacles)
         
         # 六、任务层/停滞
-        self._calculate_mission_signals(trace, timestamps, current_idx)
+        self._calculate_mission_signals(frames, current_idx, pose.stopped_duration)
     
-    def _calculate_longitudinal_signals(self, ego: Dict, truth: Dict):
+    def _calculate_longitudinal_signals(self, ego: Dict, truth: Dict, ego_speed: float, obstacles: Dict):
         """计算纵向基础信号"""
-        cfg = self.config['longitudinal']
-        inf = self.config['defaults']['infinity']
+        inf = self._inf
         
         # v_ego: 自车纵向速度
-        ego["v_ego"] = self._get_ego_speed(ego)
+        ego["v_ego"] = ego_speed
         
         # front_dist: 最近前车距离
         ego["front_dist"] = truth.get("minDistToEgo", inf)
         
         # d_safe: 动态安全距离
-        d0 = cfg['d_safe_d0']
-        k = cfg['d_safe_k']
-        ego["d_safe"] = d0 + k * ego["v_ego"]
+        ego["d_safe"] = self._d_safe_d0 + self._d_safe_k * ego["v_ego"]
         
         # v_rel_front: 相对前车的纵向速度
         front_npc_id = truth.get("NPCAhead")
         if front_npc_id:
             # 查找前车速度
             v_front = 0
-            for obs in truth.get("obsList", []):
-                if obs.get("id") == front_npc_id:
-                    v_front = obs.get("speed", 0)
+            for obs_id, speed in zip(obstacles["ids"], obstacles["speeds"]):
+                if obs_id == front_npc_id:
+                    v_front = speed
                     break
             ego["v_rel_front"] = ego["v_ego"] - v_front
         else:
@@ -782,55 +1175,34 @@ class PostProcessor:
             ego["v_rel_front"] = ego["v_ego"]
         
         # thw_front: Time-headway
-        min_vel = cfg['min_velocity_thw']
-        if ego["v_ego"] > min_vel:
+        if ego["v_ego"] > self._min_velocity_thw:
             ego["thw_front"] = ego["front_dist"] / ego["v_ego"]
         else:
             ego["thw_front"] = inf
         
         # ttc_front: 近似TTC
-        min_vel_ttc = cfg['min_velocity_ttc']
-        if ego["v_rel_front"] > min_vel_ttc:
+        if ego["v_rel_front"] > self._min_velocity_ttc:
             ego["ttc_front"] = ego["front_dist"] / ego["v_rel_front"]
         else:
             ego["ttc_front"] = inf
     
-    def _calculate_braking_signals(self, trace: Dict, timestamps: List[float], current_idx: int):
+    def _calculate_braking_signals(self, frames: List[Tuple[float, Dict]], current_idx: int, ego_accel: float,
+                                   hard_brake: bool):
         """计算纵向动作&制动信号"""
-        cfg = self.config['braking']
-        current_ts = timestamps[current_idx]
-        ego = trace[current_ts]["ego"]
-        
-        # a_ego: 自车纵向加速度
-        if current_idx > 0:
-            prev_ts = timestamps[current_idx - 1]
-            prev_ego = trace[prev_ts]["ego"]
-            dt = current_ts - prev_ts
-            
-            v_current = ego.get("v_ego", 0)
-            v_prev = prev_ego.get("v_ego", 0)
-            
-            if dt > 0:
-                ego["a_ego"] = (v_current - v_prev) / dt
-            else:
-                ego["a_ego"] = 0
-        else:
-            ego["a_ego"] = 0
+        ego = frames[current_idx][1]["ego"]
         
-        # HardBrake: 强制制动标志
-        brake_percentage = ego.get("Chassis", {}).get("brakePercentage", 0)
-        hard_brake_accel = cfg['hard_brake_accel']
-        hard_brake_pct = cfg['hard_brake_percentage']
+        # a_ego: 自车纵向加速度，由_get_ego_poses对整条轨迹批量计算
+        ego["a_ego"] = ego_accel
         
-        ego["HardBrake"] = (ego["a_ego"] < hard_brake_accel) or (brake_percentage > hard_brake_pct)
+        # HardBrake: 强制制动标志，同样由_get_ego_poses批量计算
+        ego["HardBrake"] = hard_brake
         
         # IsLaneChanging: 当前帧是否处于变道状态 (已经在_process_temporal_fields中计算)
         # 这里只需要使用
         
         # LaneChangeStarted / LaneChangeFinished: 变道开始/结束事件
         if current_idx > 0:
-            prev_ts = timestamps[current_idx - 1]
-            prev_ego = trace[prev_ts]["ego"]
+            prev_ego = frames[current_idx - 1][1]["ego"]
             
             is_changing_now = ego.get("isLaneChanging", False)
             was_changing = prev_ego.get("isLaneChanging", False)
@@ -846,7 +1218,6 @@ class PostProcessor:
     
     def _calculate_lateral_signals(self, ego: Dict, truth: Dict):
         """计算横向/车道相关信号"""
-        cfg = self.config['lateral']
         
         # lat_offset: 相对车道中心线的横向偏移
         # TODO: 需要地图提供车道中心线，这里简化处理
@@ -858,7 +1229,7 @@ class PostProcessor:
         
         if lane_id is not None:
             # 粗略判断：有车道ID且偏移小于阈值
-            ego["InLane"] = abs(ego["lat_offset"]) < cfg['lane_offset_threshold']
+            ego["InLane"] = abs(ego["lat_offset"]) < self._lane_offset_threshold
         else:
             ego["InLane"] = False
         
@@ -868,9 +1239,7 @@ class PostProcessor:
     
     def _calculate_traffic_control_signals(self, ego: Dict, traffic_lights: Dict):
         """计算红灯/停车线/Stop Sign相关信号"""
-        cfg_light = self.config['traffic_light']
-        cfg_stop = self.config['stop_sign']
-        inf = self.config['defaults']['infinity']
+        inf = self._inf
         
         # 红绿灯相关
         traffic_light_list = traffic_lights.get("trafficLightList", [])
@@ -883,7 +1252,7 @@ class PostProcessor:
             if 0 <= nearest_idx < len(traffic_light_list):
                 nearest_light = traffic_light_list[nearest_idx]
                 color = nearest_light.get("color", "")
-                red_light_ahead = (color == "RED") and (traffic_light_dist < cfg_light['red_light_range'])
+                red_light_ahead = (color == "RED") and (traffic_light_dist < self._red_light_range)
         
         ego["RedLightAhead"] = red_light_ahead
         
@@ -893,81 +1262,65 @@ class PostProcessor:
         else:
             ego["DistToRedStopLine"] = inf
         
-        # ShouldStopForRed: 当前是否应准备在红灯前停车
-        ego["ShouldStopForRed"] = red_light_ahead and (traffic_light_dist < cfg_light['red_light_range'])
+        # ShouldStopForRed: 当前是否应准备在红灯前停车（条件与RedLightAhead相同）
+        ego["ShouldStopForRed"] = red_light_ahead
         
         # Stop Sign相关
         stop_sign_dist = ego.get("stopSignAhead", inf)
         
         # StopSignAhead: 前方存在Stop Sign
-        ego["StopSignAhead"] = stop_sign_dist < cfg_stop['stop_sign_range']
+        stop_sign_ahead = stop_sign_dist < self._stop_sign_range
+        ego["StopSignAhead"] = stop_sign_ahead
         
         # DistToStopSign / DistToStopLine: 到Stop Sign/停止线距离
         ego["DistToStopSign"] = stop_sign_dist
         ego["DistToStopLine"] = ego.get("stoplineAhead", inf)
         
-        # ShouldStopAtStopSign
-        ego["ShouldStopAtStopSign"] = ego["StopSignAhead"] and (stop_sign_dist < cfg_stop['stop_sign_range'])
+        # ShouldStopAtStopSign（条件与StopSignAhead相同）
+        ego["ShouldStopAtStopSign"] = stop_sign_ahead
     
-    def _calculate_crosswalk_signals(self, ego: Dict, truth: Dict):
+    def _calculate_crosswalk_signals(self, ego: Dict, obstacles: Dict):
         """计算人行横道/行人相关信号"""
-        inf = self.config['defaults']['infinity']
+        inf = self._inf
         
         # PedInCrosswalk: 人行横道中存在行人
         ped_in_crosswalk = False
-        crosswalks = self.map_info.get_crosswalk_config()
+        crosswalk_buffer = self._crosswalk_buffer
         
-        for obs in truth.get("obsList", []):
-            if obs.get("type") != "PEDESTRIAN":
-                continue
+        ped_positions = [position for obs_type, position in zip(obstacles["types"], obstacles["positions"])
+                         if obs_type == "PEDESTRIAN"]
+        if ped_positions:
+            # 行人位置
+            ped_points = shapely.points(ped_positions)
             
-            # 获取行人位置
-            pos = obs.get("position", {})
-            ped_point = Point(pos.get("x", 0), pos.get("y", 0))
-            
-            # 检查是否在任何人行横道内
-            for cw_area in crosswalks.values():
-                if cw_area.contains(ped_point) or cw_area.distance(ped_point) < self.config['crosswalk']['crosswalk_buffer']:
-                    ped_in_crosswalk = True
-                    break
-            
-            if ped_in_crosswalk:
-                break
+            # 检查是否在任何人行横道内：先由空间索引一次取出所有行人缓冲距离内的(行人, 人行横道)对，再批量精确判断
+            ped_idx, cw_idx = self._crosswalk_tree.query(ped_points, predicate='dwithin',
+                                                         distance=max(crosswalk_buffer, 0))
+            if len(cw_idx) > 0:
+                cw_areas = self._crosswalk_array[cw_idx]
+                candidates = ped_points[ped_idx]
+                ped_in_crosswalk = bool(np.any(shapely.contains(cw_areas, candidates) |
+                                               (shapely.distance(cw_areas, candidates) < crosswalk_buffer)))
         
         ego["PedInCrosswalk"] = ped_in_crosswalk
         
         # DistToCrosswalk: 到最近前方人行横道横断面的距离
         ego["DistToCrosswalk"] = ego.get("crosswalkAhead", inf)
     
-    def _calculate_mission_signals(self, trace: Dict, timestamps: List[float], current_idx: int):
+    def _calculate_mission_signals(self, frames: List[Tuple[float, Dict]], current_idx: int,
+                                   stopped_duration: float):
         """计算任务层/停滞信号"""
-        cfg = self.config['mission']
-        inf = self.config['defaults']['infinity']
+        inf = self._inf
         
-        current_ts = timestamps[current_idx]
-        ego = trace[current_ts]["ego"]
-        truth = trace[current_ts]["truth"]
+        trace_point = frames[current_idx][1]
+        ego = trace_point["ego"]
+        truth = trace_point["truth"]
         
         # ReachDestination: 是否到达目的地 (已经在_process_temporal_fields中设置)
         # 这里不需要重复计算
         
-        # StoppedDuration: 当前这次连续静止的时长
-        v_ego = ego.get("v_ego", 0)
-        stopped_threshold = cfg['stopped_velocity']
-        
-        if current_idx > 0:
-            prev_ts = timestamps[current_idx - 1]
-            prev_ego = trace[prev_ts]["ego"]
-            dt = current_ts - prev_ts
-            
-            if v_ego < stopped_threshold:
-                # 当前静止，累加时长
-                ego["StoppedDuration"] = prev_ego.get("StoppedDuration", 0) + dt
-            else:
-                # 当前运动，重置
-                ego["StoppedDuration"] = 0
-        else:
-            ego["StoppedDuration"] = 0
+        # StoppedDuration: 当前这次连续静止的时长，由_get_ego_poses对整条轨迹批量计算
+        ego["StoppedDuration"] = stopped_duration
         
         # UnjustifiedStop: 不合理停滞标志
         stopped_duration = ego.get("StoppedDuration", 0)
@@ -976,10 +1329,38 @@ class PostProcessor:
         front_dist = ego.get("front_dist", inf)
         
         unjustified_conditions = (
-            stopped_duration > cfg['unjustified_stop_duration'] and
+            stopped_duration > self._unjustified_stop_duration and
             not red_light and
             not ped_in_cw and
-            front_dist > cfg['unjustified_stop_front_dist']
+            front_dist > self._unjustified_stop_front_dist
         )
         
         ego["UnjustifiedStop"] = unjustified_conditions
+
+
+# 第一遍并行处理时，每个工作进程各持有一个PostProcessor
+_worker_processor: Optional[PostProcessor] = None
+
+
+def _init_first_pass_worker(map_info, config_path: Optional[str]):
+    """工作进程初始化，构造本进程的PostProcessor"""
+    global _worker_processor
+    _worker_processor = PostProcessor(map_info, config_path)
+
+
+def _process_first_pass_chunk(chunk: List[Tuple[Dict, Dict, EgoPose]]) -> List[Tuple[Dict, Dict]]:
+    """
+    在工作进程中计算一批帧的单时刻字段
+    
+    Args:
+        chunk: (自车数据, 真值数据, 自车位姿派生量)列表
+    
+    Returns:
+        与chunk一一对应的(自车字段, 真值字段)，只包含第一遍写入的字段
+    """
+    results = []
+    for ego, truth, pose in chunk:
+        _worker_processor._process_single_timestamp({"ego": ego, "truth": truth}, pose)
+        results.append(({k: v for k, v in ego.items() if k in SINGLE_TIMESTAMP_EGO_FIELDS},
+                        {k: v for k, v in truth.items() if k in SINGLE_TIMESTAMP_TRUTH_FIELDS}))
+    return results
@@ -1,12 +1,127 @@
 """消息处理器基类和各类消息处理器"""
+import base64
 import copy
 import math
-from typing import Dict, Any, Optional, List
+import numpy as np
+from typing import Dict, Any, Callable, Optional, List, Tuple
+import shapely
 from shapely.geometry import Polygon, Point
-from google.protobuf.json_format import MessageToDict
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal.type_checkers import ToShortestFloat
+from google.protobuf.json_format import MessageToDict, SerializeToJsonError
 
-from .config import TURN_SIGNAL_MAP, GEAR_MAP, DEFAULT_DISTANCE, EGO_VEHICLE
-from .utils import convert_velocity_to_speed, calculate_polygon_points, find_nearest_time
+from .config import TURN_SIGNAL_LUT, GEAR_LUT, DEFAULT_DISTANCE, EGO_VEHICLE
+from .utils import (convert_velocity_to_speed, calculate_polygon_points, calculate_polygon_points_batch,
+                    lookup_enum)
+
+
+# 各字段的转换方式：(JSON字段名, 取值转换函数, 是否repeated)，转换函数为None表示直接使用原值；
+# 空元组表示该字段（map、扩展字段）交给MessageToDict处理
+_FIELD_PLANS: Dict[FieldDescriptor, Tuple] = {}
+
+_INT64_CPP_TYPES = (FieldDescriptor.CPPTYPE_INT64, FieldDescriptor.CPPTYPE_UINT64)
+
+
+def message_to_dict(message: Any) -> Dict:
+    """
+    将protobuf消息转换为字典，结果与MessageToDict(message)一致
+    
+    按字段描述符缓存字段名和取值转换方式，只遍历已设置的字段，
+    省去MessageToDict对每个字段重复的反射判断
+    
+    Args:
+        message: protobuf消息对象
+    
+    Returns:
+        消息字典
+    """
+    if _is_well_known_type(message.DESCRIPTOR):
+        return MessageToDict(message)
+    return _regular_message_to_dict(message)
+
+
+def _is_well_known_type(message_type: Any) -> bool:
+    """Well-Known类型（Timestamp、包装类型等）有专门的JSON表示，交给MessageToDict处理"""
+    return message_type.file.name.startswith('google/protobuf/')
+
+
+def _regular_message_to_dict(message: Any) -> Dict:
+    """转换非Well-Known类型的消息"""
+    result = {}
+    for field, value in message.ListFields():
+        plan = _FIELD_PLANS.get(field)
+        if plan is None:
+            plan = _FIELD_PLANS[field] = _build_field_plan(field)
+        if not plan:
+            return MessageToDict(message)
+        
+        name, convert, repeated = plan
+        if repeated:
+            result[name] = [convert(v) for v in value] if convert else list(value)
+        else:
+            result[name] = convert(value) if convert else value
+    return result
+
+
+def _build_field_plan(field: FieldDescriptor) -> Tuple:
+    """按MessageToDict的规则确定单个字段的JSON字段名和取值转换方式"""
+    if field.is_extension:
+        return ()
+    if field.cpp_type == FieldDescriptor.CPPTYPE_MESSAGE:
+        if field.message_type.GetOptions().map_entry:
+            return ()
+        convert = MessageToDict if _is_well_known_type(field.message_type) else _regular_message_to_dict
+    elif field.cpp_type == FieldDescriptor.CPPTYPE_ENUM:
+        convert = _build_enum_converter(field)
+    elif field.type == FieldDescriptor.TYPE_BYTES:
+        convert = _bytes_to_json
+    elif field.cpp_type in _INT64_CPP_TYPES:
+        convert = str
+    elif field.cpp_type == FieldDescriptor.CPPTYPE_FLOAT:
+        convert = _float_to_json
+    elif field.cpp_type == FieldDescriptor.CPPTYPE_DOUBLE:
+        convert = _double_to_json
+    else:
+        convert = None
+    return field.json_name, convert, field.label == FieldDescriptor.LABEL_REPEATED
+
+
+def _build_enum_converter(field: FieldDescriptor) -> Callable[[int], Any]:
+    """枚举值转换为枚举名，未知取值的处理与MessageToDict一致"""
+    enum_type = field.enum_type
+    if enum_type.full_name == 'google.protobuf.NullValue':
+        return lambda value: None
+    names = {v.number: v.name for v in enum_type.values}
+    is_closed = enum_type.is_closed
+    
+    def convert(value: int) -> Any:
+        name = names.get(value)
+        if name is not None:
+            return name
+        if is_closed:
+            raise SerializeToJsonError('Enum field contains an integer value '
+                                       'which can not mapped to an enum value.')
+        return value
+    
+    return convert
+
+
+def _bytes_to_json(value: bytes) -> str:
+    return base64.b64encode(value).decode('utf-8')
+
+
+def _double_to_json(value: float) -> Any:
+    if math.isfinite(value):
+        return value
+    if math.isnan(value):
+        return 'NaN'
+    return '-Infinity' if value < 0.0 else 'Infinity'
+
+
+def _float_to_json(value: float) -> Any:
+    if math.isfinite(value):
+        return ToShortestFloat(value)
+    return _double_to_json(value)
 
 
 class MessageProcessor:
@@ -41,7 +156,7 @@ class PoseProcessor(MessageProcessor):
     
     def process(self, message: Any, timestamp: float, context: Optional[Dict] = None) -> Dict:
         """处理pose消息"""
-        msg_dict = MessageToDict(message)
+        msg_dict = message_to_dict(message)
         
         # 添加车辆尺寸信息
         msg_dict['size'] = {
@@ -69,12 +184,11 @@ class ChassisProcessor(MessageProcessor):
     
     def process(self, message: Any, timestamp: float, context: Optional[Dict] = None) -> Dict:
         """处理chassis消息"""
-        msg_dict = MessageToDict(message)
+        msg_dict = message_to_dict(message)
         
-        # 转换档位信息
+        # 转换档位信息（直接用枚举整数值查表）
         if 'gearLocation' in msg_dict:
-            gear_str = msg_dict['gearLocation']
-            msg_dict['gearLocation'] = GEAR_MAP.get(gear_str, 0)
+            msg_dict['gearLocation'] = lookup_enum(GEAR_LUT, message.gear_location)
         
         return msg_dict
 
@@ -84,29 +198,26 @@ class PlanningProcessor(MessageProcessor):
     
     def process(self, message: Any, timestamp: float, context: Optional[Dict] = None) -> Dict:
         """处理planning消息"""
-        msg_dict = MessageToDict(message)
         result = {}
         
         try:
             # 提取转向信号
-            vehicle_signal = msg_dict.get('decision', {}).get('vehicleSignal', {})
-            turn_signal = vehicle_signal.get('turnSignal', 'TURN_NONE')
-            result['planning_turn_signal'] = TURN_SIGNAL_MAP.get(turn_signal, 0)
+            turn_signal = message.decision.vehicle_signal.turn_signal
+            result['planning_turn_signal'] = lookup_enum(TURN_SIGNAL_LUT, turn_signal)
             
-            # 提取超车决策
+            # 提取超车决策；planning消息包含完整轨迹，只读取决策字段，不转换整条消息
             is_overtaking = False
-            decisions = msg_dict.get('decision', {}).get('objectDecision', {})
-            decision_list = decisions.get('decision', [])
+            decision_list = message.decision.object_decision.decision
             
             for item in decision_list:
-                object_decisions = item.get('objectDecision', [])
+                object_decisions = item.object_decision
                 if len(object_decisions) > 0:
                     item0 = object_decisions[0]
                     # 检查超车决策
-                    if 'overtake' in item0 and item0.get('overtake', {}).get('distanceS', 0) != 0:
+                    if item0.HasField('overtake') and item0.overtake.distance_s != 0:
                         is_overtaking = True
                     # 检查微调决策
-                    if 'nudge' in item0 and item0.get('nudge', {}).get('distanceL', 0) != 0:
+                    if item0.HasField('nudge') and item0.nudge.distance_l != 0:
                         is_overtaking = True
             
             result['is_overtaking'] = is_overtaking
@@ -125,10 +236,12 @@ class ObstaclesProcessor(MessageProcessor):
     def __init__(self, map_info=None):
         super().__init__(map_info)
         self.agent_ids = []
+        # 与agent_ids内容相同，用于O(1)判断是否已记录
+        self._agent_ids_set = set()
     
     def process(self, message: Any, timestamp: float, context: Optional[Dict] = None) -> Dict:
         """处理obstacles消息"""
-        msg_dict = MessageToDict(message)
+        msg_dict = message_to_dict(message)
         result = {}
         
         # 获取障碍物列表（支持两种命名格式）
@@ -146,22 +259,16 @@ class ObstaclesProcessor(MessageProcessor):
             pose_data = context['pose']
             
             # 处理每个障碍物
-            for obs in perception_obstacles:
-                self._process_single_obstacle(obs, pose_data)
-            
-            # 找到最近的障碍物
-            min_dist = DEFAULT_DISTANCE
-            nearest_id = None
+            self.process_obstacles(perception_obstacles, pose_data)
             
             for obs in perception_obstacles:
                 obs_id = obs.get("id", "unknown")
-                if obs_id not in self.agent_ids:
+                if obs_id not in self._agent_ids_set:
+                    self._agent_ids_set.add(obs_id)
                     self.agent_ids.append(obs_id)
-                
-                dist = obs.get("distToEgo", DEFAULT_DISTANCE)
-                if dist < min_dist:
-                    min_dist = dist
-                    nearest_id = obs_id
+            
+            # 找到最近的障碍物
+            min_dist, nearest_id = self.find_nearest_obstacle(perception_obstacles)
             
             result["minDistToEgo"] = min_dist
             result["nearestGtObs"] = nearest_id
@@ -176,11 +283,152 @@ class ObstaclesProcessor(MessageProcessor):
         
         return result
     
+    def process_obstacles(self, obstacles: List[Dict], pose_data: Dict):
+        """
+        处理一帧内的所有障碍物，到自车的距离和所在车道/路口分别通过一次批量计算得到
+        
+        Args:
+            obstacles: 障碍物字典列表（原地更新）
+            pose_data: 自车pose数据
+        """
+        self._fill_missing_polygons(obstacles)
+        
+        obs_areas = [self._prepare_obstacle(obs) for obs in obstacles]
+        self._update_dist_to_ego(obstacles, obs_areas, pose_data)
+        
+        # 所在车道/路口只依赖障碍物多边形
+        if not self.map_info:
+            return
+        pending_obs = [obs for obs, obs_area in zip(obstacles, obs_areas) if obs_area is not None]
+        pending_areas = [obs_area for obs_area in obs_areas if obs_area is not None]
+        
+        if not pending_areas:
+            return
+        
+        try:
+            # 障碍物只使用第一个命中的车道/路口
+            results = self.map_info.find_areas_for_agents(pending_areas, first_only=True)
+        except Exception:
+            # 批量查询失败时（如存在无效多边形）逐个查询，只跳过出错的障碍物
+            for obs, obs_area in zip(pending_obs, pending_areas):
+                try:
+                    self._apply_area_result(
+                        obs, self.map_info.find_which_area_the_ego_is_in(obs_area, first_only=True))
+                except Exception:
+                    pass
+            return
+        
+        for obs, result in zip(pending_obs, results):
+            self._apply_area_result(obs, result)
+    
+    @staticmethod
+    def find_nearest_obstacle(obstacles: List[Dict]) -> Tuple[float, Any]:
+        """
+        查找距离自车最近且小于默认距离的障碍物
+        
+        Args:
+            obstacles: 已计算distToEgo的障碍物字典列表
+        
+        Returns:
+            (最近距离, 障碍物id)，没有小于默认距离的障碍物时为(DEFAULT_DISTANCE, None)
+        """
+        if not obstacles:
+            return DEFAULT_DISTANCE, None
+        
+        dists = [obs.get("distToEgo", DEFAULT_DISTANCE) for obs in obstacles]
+        # 不小于默认距离（含NaN）的障碍物不参与比较；argmin在距离相同时取第一个，与逐个比较一致
+        values = np.asarray(dists, dtype=np.float64)
+        candidates = np.where(values < DEFAULT_DISTANCE, values, np.inf)
+        idx = int(np.argmin(candidates))
+        if not candidates[idx] < DEFAULT_DISTANCE:
+            return DEFAULT_DISTANCE, None
+        return dists[idx], obstacles[idx].get("id", "unknown")
+    
+    def update_dist_to_ego(self, obstacles: List[Dict], pose_data: Dict):
+        """
+        只更新一帧内障碍物到自车的距离，其余字段沿用上次process_obstacles的结果
+        
+        Args:
+            obstacles: 已经过process_obstacles处理的障碍物字典列表（原地更新）
+            pose_data: 自车pose数据
+        """
+        self._update_dist_to_ego(obstacles, [obs["currentLane"].get("area") for obs in obstacles], pose_data)
+    
+    def _update_dist_to_ego(self, obstacles: List[Dict], obs_areas: List[Optional[Polygon]], pose_data: Dict):
+        """
+        计算一帧内障碍物到自车的距离，已有多边形的障碍物通过一次shapely.distance批量计算
+        
+        Args:
+            obstacles: 障碍物字典列表（原地更新）
+            obs_areas: 与obstacles对应的障碍物多边形，为None时由polygonPoint构造
+            pose_data: 自车pose数据
+        """
+        ego_area = pose_data.get('area')
+        batch_obs = []
+        batch_areas = []
+        for obs, obs_area in zip(obstacles, obs_areas):
+            if ego_area is None or len(obs.get("polygonPoint", [])) == 0:
+                obs["distToEgo"] = DEFAULT_DISTANCE
+            elif obs_area is None:
+                obs["distToEgo"] = self._safe_dist_to_ego(obs, pose_data)
+            else:
+                batch_obs.append(obs)
+                batch_areas.append(obs_area)
+        
+        if not batch_areas:
+            return
+        
+        try:
+            distances = shapely.distance(ego_area, batch_areas).tolist()
+        except Exception:
+            # 批量计算失败时逐个计算，只有出错的障碍物取默认距离
+            for obs, obs_area in zip(batch_obs, batch_areas):
+                obs["distToEgo"] = self._safe_dist_to_ego(obs, pose_data, obs_area)
+            return
+        
+        for obs, dist in zip(batch_obs, distances):
+            obs["distToEgo"] = dist
+    
+    def _safe_dist_to_ego(self, obs: Dict, pose_data: Dict, obs_area: Optional[Polygon] = None) -> float:
+        """逐个计算障碍物到自车的距离，出错时返回默认距离"""
+        try:
+            return self._calculate_dist_to_ego(obs, pose_data, obs_area)
+        except Exception:
+            return DEFAULT_DISTANCE
+    
+    def _fill_missing_polygons(self, obstacles: List[Dict]):
+        """对缺少polygonPoint的障碍物，由位置、尺寸和朝向批量计算多边形角点"""
+        missing = [obs for obs in obstacles
+                   if not obs.get("polygonPoint", obs.get("polygon_point", []))
+                   and all(k in obs for k in ['position', 'length', 'width', 'theta'])]
+        if not missing:
+            return
+        
+        corners = calculate_polygon_points_batch(
+            [obs['position'].get('x', 0) for obs in missing],
+            [obs['position'].get('y', 0) for obs in missing],
+            [obs['length'] for obs in missing],
+            [obs['width'] for obs in missing],
+            [obs['theta'] for obs in missing]
+        ).tolist()
+        for obs, points in zip(missing, corners):
+            obs["polygonPoint"] = [{'x': x, 'y': y} for x, y in points]
+    
     def _process_single_obstacle(self, obs: Dict, pose_data: Dict):
         """处理单个障碍物"""
-        # 初始化字段
+        self.process_obstacles([obs], pose_data)
+    
+    def _prepare_obstacle(self, obs: Dict) -> Optional[Polygon]:
+        """
+        计算单个障碍物除距离和所在区域外的字段
+        
+        Returns:
+            障碍物多边形，没有多边形时返回None
+        """
+        # 初始化字段；同一条obstacles消息会被多个pose时刻重复处理，多边形只依赖障碍物自身，沿用上次构造的结果
         if "currentLane" not in obs:
             obs["currentLane"] = {}
+        prev_area = obs["currentLane"].get("area")
         obs["currentLane"]["currentLaneId"] = None
         obs["currentLane"]["type"] = None
         obs["currentLane"]["area"] = None
@@ -189,58 +437,46 @@ class ObstaclesProcessor(MessageProcessor):
         velocity = obs.get('velocity', {})
         obs['speed'] = convert_velocity_to_speed(velocity)
         
-        # 处理多边形点
+        # 处理多边形点（可由位置和尺寸计算的缺失多边形已由_fill_missing_polygons批量补全）
         polygon_points = obs.get("polygonPoint", obs.get("polygon_point", []))
-        
-        # 如果没有polygonPoint，从位置和尺寸计算
-        if not polygon_points or len(polygon_points) == 0:
-            if all(k in obs for k in ['position', 'length', 'width', 'theta']):
-                position = obs['position']
-                polygon_points = self._calculate_obstacle_polygon(
-                    position.get('x', 0), position.get('y', 0),
-                    obs['length'], obs['width'], obs['theta']
-                )
-                obs["polygonPoint"] = polygon_points
-            else:
-                obs["polygonPoint"] = []
-        else:
-            if "polygonPoint" not in obs and "polygon_point" in obs:
-                obs["polygonPoint"] = obs["polygon_point"]
-        
-        # 计算到自车的距离
-        try:
-            obs["distToEgo"] = self._calculate_dist_to_ego(obs, pose_data)
-        except Exception:
-            obs["distToEgo"] = DEFAULT_DISTANCE
-        
-        # 确定障碍物所在车道/路口
-        if self.map_info and len(obs.get("polygonPoint", [])) > 0:
+        if not polygon_points:
+            obs["polygonPoint"] = []
+        elif "polygonPoint" not in obs:
+            obs["polygonPoint"] = obs["polygon_point"]
+        
+        # 障碍物多边形只构造一次，距离计算和所在区域查询共用
+        obs_area = prev_area
+        if obs_area is None and len(obs.get("polygonPoint", [])) > 0:
             try:
-                points = [(p.get("x", 0), p.get("y", 0)) for p in obs["polygonPoint"]]
-                obs_area = Polygon(points)
-                obs["currentLane"]["area"] = obs_area
-                
-                result = self.map_info.find_which_area_the_ego_is_in(obs_area)
-                
-                if result and len(result) > 0:
-                    if "lane_id" in result[0]:
-                        obs["currentLane"]["currentLaneId"] = result[0]["lane_id"]
-                        obs["currentLane"]["type"] = 'lane'
-                        obs["currentLane"]["turn"] = result[0].get("turn", 0)
-                    elif "junction_id" in result[0]:
-                        obs["currentLane"]["currentLaneId"] = result[0]["junction_id"]
-                        obs["currentLane"]["type"] = 'junction'
+                obs_area = Polygon([(p.get("x", 0), p.get("y", 0)) for p in obs["polygonPoint"]])
             except Exception:
-                pass
+                obs_area = None
+        
+        # 到自车的距离和所在车道/路口由调用方批量计算
+        if self.map_info and obs_area is not None:
+            obs["currentLane"]["area"] = obs_area
+        return obs_area
     
-    def _calculate_obstacle_polygon(self, center_x: float, center_y: float,
-                                   length: float, width: float, theta: float) -> List[Dict]:
-        """计算障碍物的多边形角点"""
-        points = calculate_polygon_points(center_x, center_y, length, width, theta)
-        return [{'x': p[0], 'y': p[1]} for p in points]
+    def _apply_area_result(self, obs: Dict, result: Optional[List[Dict]]):
+        """根据地图查询结果确定障碍物所在车道/路口"""
+        if result and len(result) > 0:
+            if "lane_id" in result[0]:
+                obs["currentLane"]["currentLaneId"] = result[0]["lane_id"]
+                obs["currentLane"]["type"] = 'lane'
+                obs["currentLane"]["turn"] = result[0].get("turn", 0)
+            elif "junction_id" in result[0]:
+                obs["currentLane"]["currentLaneId"] = result[0]["junction_id"]
+                obs["currentLane"]["type"] = 'junction'
     
-    def _calculate_dist_to_ego(self, obstacle: Dict, pose_data: Dict) -> float:
-        """计算障碍物到自车的距离"""
+    def _calculate_dist_to_ego(self, obstacle: Dict, pose_data: Dict, obs_area: Optional[Polygon] = None) -> float:
+        """
+        计算障碍物到自车的距离
+        
+        Args:
+            obstacle: 障碍物字典
+            pose_data: 自车pose数据
+            obs_area: 已构造的障碍物多边形，为None时由polygonPoint构造
+        """
         ego_area = pose_data.get('area')
         if ego_area is None:
             return DEFAULT_DISTANCE
@@ -250,8 +486,8 @@ class ObstaclesProcessor(MessageProcessor):
             return DEFAULT_DISTANCE
         
         try:
-            points = [(p.get("x", 0), p.get("y", 0)) for p in polygon_points]
-            obs_area = Polygon(points)
+            if obs_area is None:
+                obs_area = Polygon([(p.get("x", 0), p.get("y", 0)) for p in polygon_points])
             return ego_area.distance(obs_area)
         except Exception:
             return DEFAULT_DISTANCE
@@ -260,21 +496,39 @@ class ObstaclesProcessor(MessageProcessor):
 class TrafficLightProcessor(MessageProcessor):
     """TrafficLight消息处理器"""
     
+    def __init__(self, map_info=None):
+        super().__init__(map_info)
+        # 红绿灯id到停止线的映射，首次使用时由地图构建
+        self._stop_lines: Optional[Dict[str, Any]] = None
+    
     def process(self, message: Any, timestamp: float, context: Optional[Dict] = None) -> Dict:
         """处理traffic_light消息"""
-        msg_dict = MessageToDict(message)
-        result = {}
+        msg_dict = message_to_dict(message)
+        traffic_lights = msg_dict.get("trafficLight", [])
         
-        # 需要pose数据来计算距离
+        # 需要pose数据来计算距离；初次提取时没有pose，不计算距离，但保留trafficLightList
         if context is None or 'pose' not in context:
-            result["trafficLightList"] = []
-            result["nearest"] = None
-            result["trafficLightStopLine"] = None
-            return result
+            return {
+                "trafficLightList": traffic_lights,
+                "nearest": None,
+                "trafficLightStopLine": None
+            }
         
-        pose_data = context['pose']
-        traffic_lights = msg_dict.get("trafficLight", [])
-        result["trafficLightList"] = traffic_lights
+        return self.compute_distances({"trafficLightList": traffic_lights}, context['pose'])
+    
+    def compute_distances(self, traffic_light_data: Dict, pose_data: Dict) -> Dict:
+        """
+        由已处理的红绿灯列表计算最近的红绿灯及到其停止线的距离
+        
+        Args:
+            traffic_light_data: process返回的红绿灯数据，只使用其中的trafficLightList
+            pose_data: 自车pose数据
+        
+        Returns:
+            包含trafficLightList、nearest和trafficLightStopLine的字典
+        """
+        traffic_lights = traffic_light_data.get("trafficLightList", [])
+        result = {"trafficLightList": traffic_lights}
         
         # 找到最近的红绿灯
         if not self.map_info or len(traffic_lights) == 0:
@@ -309,12 +563,18 @@ class TrafficLightProcessor(MessageProcessor):
         if ego_area is None:
             return None
         
-        traffic_signals = self.map_info.get_traffic_signals()
-        
-        for signal in traffic_signals:
-            if signal["id"] == light_id:
+        stop_line = self._get_stop_lines().get(light_id)
+        if stop_line is None:
+            return None
+        return ego_area.distance(stop_line)
+    
+    def _get_stop_lines(self) -> Dict[str, Any]:
+        """红绿灯id到停止线的映射，同一id取地图中第一个有停止线的信号灯"""
+        if self._stop_lines is None:
+            stop_lines = {}
+            for signal in self.map_info.get_traffic_signals():
                 stop_line = signal.get("stop_line")
                 if stop_line:
-                    return ego_area.distance(stop_line)
-        
-        return None
+                    stop_lines.setdefault(signal["id"], stop_line)
+            self._stop_lines = stop_lines
+        return self._stop_lines
@@ -1,32 +1,35 @@
 """轨迹提取器主模块"""
 import pickle
-from typing import Dict, List, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from cyber_record.record import Record
 
 from .config import TOPIC_MAP
 from .processors import (
-    PoseProcessor, ChassisProcessor, PlanningProcessor,
+    MessageProcessor, PoseProcessor, ChassisProcessor, PlanningProcessor,
     ObstaclesProcessor, TrafficLightProcessor
 )
 from .map_loader import MapInfo
-from .utils import find_nearest_time, get_map_name_from_path
+from .utils import find_nearest_time_index, get_map_name_from_path
 from .post_processor import PostProcessor
 
 
 class TraceExtractor:
     """轨迹提取器，负责从record文件提取并对齐轨迹数据"""
     
-    def __init__(self, record_path: str, map_name: Optional[str] = None):
+    def __init__(self, record_path: str, map_name: Optional[str] = None, workers: int = 1):
         """
         初始化轨迹提取器
         
         Args:
             record_path: record文件路径
             map_name: 地图名称，如果不指定则从路径推断
+            workers: 使用的进程数，大于1时各类消息分别在进程池中读取和处理，后处理第一遍也并行计算
         """
         self.record_path = record_path
+        self.workers = workers
         
         # 确定地图名称
         if map_name is None:
@@ -38,13 +41,7 @@ class TraceExtractor:
         self.map_info = MapInfo(map_name)
         
         # 初始化消息处理器
-        self.processors = {
-            'pose': PoseProcessor(self.map_info),
-            'chassis': ChassisProcessor(self.map_info),
-            'planning': PlanningProcessor(self.map_info),
-            'obstacles': ObstaclesProcessor(self.map_info),
-            'traffic_light': TrafficLightProcessor(self.map_info)
-        }
+        self.processors = _create_processors(self.map_info)
         
         # 存储提取的消息数据
         self.messages: Dict[str, Dict[float, Dict]] = {}
@@ -57,6 +54,14 @@ class TraceExtractor:
         
         # Agent名称列表
         self.agent_names: List[str] = []
+        # 与agent_names内容相同，用于O(1)判断是否已记录
+        self._agent_names_set = set()
+        
+        # 对齐用的各类消息时间戳（升序键列表及对应数组）
+        self._sorted_timestamps: Dict[str, Tuple[List[float], np.ndarray]] = {}
+        
+        # 上一个对齐的obstacles时间戳，其障碍物的多边形、速度和所在车道已计算过
+        self._last_obstacles_ts: Optional[float] = None
     
     def extract(self) -> Dict:
         """
@@ -75,7 +80,7 @@ class TraceExtractor:
         
         # 步骤3: 后处理，计算派生字段
         print("开始后处理...")
-        self.trace = self.post_processor.process_trace(self.trace)
+        self.trace = self.post_processor.process_trace(self.trace, workers=self.workers)
         print("后处理完成")
         
         # 步骤4: 整理输出结果
@@ -86,6 +91,10 @@ class TraceExtractor:
     
     def _extract_all_messages(self):
         """提取所有类型的消息"""
+        if self.workers > 1:
+            self._extract_all_messages_parallel()
+            return
+        
         # 先提取pose作为基准时间戳
         print("提取pose消息...")
         self._extract_messages('pose')
@@ -95,9 +104,25 @@ class TraceExtractor:
         
         with ThreadPoolExecutor(max_workers=4) as executor:
             futures = [executor.submit(self._extract_messages, topic) for topic in other_topics]
-            for future in futures:
+            # 按完成顺序取结果，任一类消息出错时尽早抛出
+            for future in as_completed(futures):
                 future.result()
     
+    def _extract_all_messages_parallel(self):
+        """
+        用进程池提取所有类型的消息，绕开GIL
+        
+        cyber_record动态生成的protobuf消息类无法pickle，因此按消息类型分配任务：
+        每个工作进程自行打开record读取并处理一类消息，只把处理结果传回主进程
+        """
+        topics = list(TOPIC_MAP.keys())
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(topics)), initializer=_init_extract_worker,
+                                 initargs=(self.map_info,)) as executor:
+            futures = {executor.submit(_extract_topic_in_worker, self.record_path, topic): topic
+                       for topic in topics}
+            for future in as_completed(futures):
+                self.messages[futures[future]] = future.result()
+    
     def _extract_messages(self, topic_name: str):
         """
         提取单类消息
@@ -106,27 +131,8 @@ class TraceExtractor:
             topic_name: 消息类型名称
         """
         self.messages[topic_name] = {}
-        processor = self.processors[topic_name]
-        topic = TOPIC_MAP[topic_name]
-        
-        record = Record(self.record_path)
-        
-        # 读取所有消息
-        messages_list = [(t, message) for _, message, t in record.read_messages(topic)]
-        
-        print(f"处理 {topic_name} 消息: {len(messages_list)} 条")
-        
-        # 处理每条消息
-        for timestamp, message in tqdm(messages_list, desc=f"Processing {topic_name}"):
-            try:
-                processed = processor.process(message, timestamp)
-                if processed:
-                    self.messages[topic_name][timestamp] = processed
-            except Exception as e:
-                # 忽略处理错误，继续下一条
-                continue
-        
-        record.close()
+        _read_topic_messages(self.record_path, topic_name, self.processors[topic_name],
+                             self.messages[topic_name])
     
     def _align_timestamps(self):
         """基于pose的时间戳对齐所有数据"""
@@ -142,11 +148,31 @@ class TraceExtractor:
         
         print(f"对齐时间戳数量: {len(pose_timestamps)}")
         
+        # 各类消息的时间戳只排序一次，逐帧对齐时二分查找
+        for topic in ('obstacles', 'planning', 'traffic_light'):
+            keys = sorted(self.messages[topic].keys())
+            self._sorted_timestamps[topic] = (keys, np.asarray(keys))
+        
         for pose_ts, chassis_ts in tqdm(zip(pose_timestamps, chassis_timestamps), 
                                         total=len(pose_timestamps),
                                         desc="对齐时间戳"):
             self._align_single_timestamp(pose_ts, chassis_ts)
     
+    def _find_nearest_timestamp(self, topic_name: str, target: float) -> Optional[float]:
+        """
+        查找指定消息中小于目标时间的最近时间戳
+        
+        Args:
+            topic_name: 消息类型名称
+            target: 目标时间戳
+        
+        Returns:
+            最近的时间戳，如果不存在则返回None
+        """
+        keys, times = self._sorted_timestamps[topic_name]
+        idx = find_nearest_time_index(times, target)
+        return keys[idx] if idx >= 0 else None
+    
     def _align_single_timestamp(self, pose_ts: float, chassis_ts: float):
         """
         对齐单个时间戳的数据
@@ -156,7 +182,7 @@ class TraceExtractor:
             chassis_ts: chassis时间戳
         """
         # 查找最近的obstacles时间戳
-        obstacles_ts = find_nearest_time(list(self.messages['obstacles'].keys()), pose_ts)
+        obstacles_ts = self._find_nearest_timestamp('obstacles', pose_ts)
         if obstacles_ts is None:
             return
         
@@ -177,7 +203,7 @@ class TraceExtractor:
         trace_point["ego"]["Chassis"] = chassis_data
         
         # 添加planning数据
-        planning_ts = find_nearest_time(list(self.messages['planning'].keys()), pose_ts)
+        planning_ts = self._find_nearest_timestamp('planning', pose_ts)
         if planning_ts is not None:
             planning_data = self.messages['planning'][planning_ts]
             trace_point["ego"]["planning_of_turn"] = planning_data.get('planning_turn_signal', 0)
@@ -196,23 +222,22 @@ class TraceExtractor:
         # 创建上下文
         context = {'pose': pose_data}
         
-        # 重新处理每个障碍物以计算距离
-        for obs in obs_list:
-            obstacles_processor._process_single_obstacle(obs, pose_data)
-        
-        # 重新计算minDistToEgo和nearestGtObs
-        min_dist = 200
-        nearest_id = None
+        # 重新处理每个障碍物以计算距离；pose频率高于obstacles时，连续多个pose会对齐到同一条obstacles消息，
+        # 此时障碍物自身的字段不变，只需按当前pose更新距离
+        if obstacles_ts == self._last_obstacles_ts:
+            obstacles_processor.update_dist_to_ego(obs_list, pose_data)
+        else:
+            obstacles_processor.process_obstacles(obs_list, pose_data)
+            self._last_obstacles_ts = obstacles_ts
         
         for obs in obs_list:
             obs_id = obs.get("id", "unknown")
-            if obs_id not in self.agent_names:
+            if obs_id not in self._agent_names_set:
+                self._agent_names_set.add(obs_id)
                 self.agent_names.append(obs_id)
-            
-            dist = obs.get("distToEgo", 200)
-            if dist < min_dist:
-                min_dist = dist
-                nearest_id = obs_id
+        
+        # 重新计算minDistToEgo和nearestGtObs
+        min_dist, nearest_id = obstacles_processor.find_nearest_obstacle(obs_list)
         
         # 构建truth数据
         trace_point["truth"] = {
@@ -223,22 +248,15 @@ class TraceExtractor:
         }
         
         # 添加traffic_light数据
-        traffic_light_ts = find_nearest_time(list(self.messages['traffic_light'].keys()), pose_ts)
+        traffic_light_ts = self._find_nearest_timestamp('traffic_light', pose_ts)
         if traffic_light_ts is not None:
             traffic_light_data = self.messages['traffic_light'][traffic_light_ts]
             
-            # 重新处理以计算距离
+            # 按当前pose计算最近的红绿灯及停止线距离，红绿灯列表沿用提取时的结果
             traffic_light_processor = self.processors['traffic_light']
-            traffic_light_data = traffic_light_processor.process(
-                None, traffic_light_ts, context={'pose': pose_data}
+            trace_point["traffic_lights"] = traffic_light_processor.compute_distances(
+                traffic_light_data, pose_data
             )
-            # 更新原始数据
-            if traffic_light_ts in self.messages['traffic_light']:
-                orig_data = self.messages['traffic_light'][traffic_light_ts]
-                if 'trafficLightList' in orig_data:
-                    traffic_light_data['trafficLightList'] = orig_data['trafficLightList']
-            
-            trace_point["traffic_lights"] = traffic_light_data
         
         # 保存到trace
         self.trace[pose_ts] = trace_point
@@ -292,7 +310,8 @@ class TraceExtractor:
         return result
 
 
-def extract_trace(record_path: str, output_path: str, map_name: Optional[str] = None) -> Dict:
+def extract_trace(record_path: str, output_path: str, map_name: Optional[str] = None,
+                  workers: int = 1) -> Dict:
     """
     提取轨迹的便捷函数
     
@@ -300,9 +319,71 @@ def extract_trace(record_path: str, output_path: str, map_name: Optional[str] =
         record_path: record文件路径
         output_path: 输出pickle文件路径
         map_name: 地图名称（可选）
+        workers: 消息提取和后处理使用的进程数（可选）
     
     Returns:
         提取的轨迹字典
     """
-    extractor = TraceExtractor(record_path, map_name)
+    extractor = TraceExtractor(record_path, map_name, workers)
     return extractor.save_to_pickle(output_path)
+
+
+def _create_processors(map_info: MapInfo) -> Dict[str, MessageProcessor]:
+    """构造各类消息的处理器"""
+    return {
+        'pose': PoseProcessor(map_info),
+        'chassis': ChassisProcessor(map_info),
+        'planning': PlanningProcessor(map_info),
+        'obstacles': ObstaclesProcessor(map_info),
+        'traffic_light': TrafficLightProcessor(map_info)
+    }
+
+
+def _read_topic_messages(record_path: str, topic_name: str, processor: MessageProcessor,
+                         messages: Dict[float, Dict]):
+    """
+    从record读取单类消息并逐条处理
+    
+    Args:
+        record_path: record文件路径
+        topic_name: 消息类型名称
+        processor: 该类消息的处理器
+        messages: 存放处理结果的字典 {timestamp: 处理后的数据}（原地更新）
+    """
+    topic = TOPIC_MAP[topic_name]
+    
+    record = Record(record_path)
+    
+    # 边读取边处理，不再先把整类消息缓存为列表；进度条降低刷新频率
+    message_count = 0
+    for _, message, timestamp in tqdm(record.read_messages(topic), desc=f"Processing {topic_name}",
+                                      mininterval=1.0):
+        message_count += 1
+        try:
+            processed = processor.process(message, timestamp)
+            if processed:
+                messages[timestamp] = processed
+        except Exception as e:
+            # 忽略处理错误，继续下一条
+            continue
+    
+    record.close()
+    
+    print(f"处理 {topic_name} 消息: {message_count} 条")
+
+
+# 并行提取消息时，每个工作进程各持有一组消息处理器
+_worker_processors: Optional[Dict[str, MessageProcessor]] = None
+
+
+def _init_extract_worker(map_info: MapInfo):
+    """工作进程初始化，构造本进程的消息处理器"""
+    global _worker_processors
+    _worker_processors = _create_processors(map_info)
+
+
+def _extract_topic_in_worker(record_path: str, topic_name: str) -> Dict[float, Dict]:
+    """在工作进程中读取并处理单类消息，返回 {timestamp: 处理后的数据}"""
+    messages = {}
+    _read_topic_messages(record_path, topic_name, _worker_processors[topic_name], messages)
+    return messages
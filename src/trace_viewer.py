@@ -1,11 +1,149 @@
 """轨迹查看器 - 将pickle轨迹转换为CSV等格式便于查看"""
+import gc
 import pickle
 import csv
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Callable, Optional, Tuple
 import json
 
 
+# 自车CSV各列（timestamp列之后）：(列名, 从轨迹点开始逐层取值的键路径, 缺省值)
+EGO_CSV_COLUMNS: Tuple[Tuple[str, Tuple[str, ...], Any], ...] = (
+    ('ego_x', ('ego', 'pose', 'position', 'x'), 0),
+    ('ego_y', ('ego', 'pose', 'position', 'y'), 0),
+    ('ego_z', ('ego', 'pose', 'position', 'z'), 0),
+    ('ego_heading', ('ego', 'pose', 'heading'), 0),
+    ('ego_speed', ('ego', 'Chassis', 'speed'), 0),
+    ('ego_gear', ('ego', 'Chassis', 'gearLocation'), 0),
+    ('planning_turn', ('ego', 'planning_of_turn'), 0),
+    ('is_overtaking', ('ego', 'isOverTaking'), False),
+    ('is_lane_changing', ('ego', 'isLaneChanging'), False),
+    ('is_turning_around', ('ego', 'isTurningAround'), False),
+    ('current_lane_id', ('ego', 'currentLane', 'currentLaneId'), 'None'),
+    ('current_lane_type', ('ego', 'currentLane', 'type'), 'None'),
+    ('crosswalk_ahead', ('ego', 'crosswalkAhead'), 999),
+    ('junction_ahead', ('ego', 'junctionAhead'), 999),
+    ('stop_sign_ahead', ('ego', 'stopSignAhead'), 999),
+    ('stopline_ahead', ('ego', 'stoplineAhead'), 999),
+    ('is_traffic_jam', ('ego', 'isTrafficJam'), False),
+    ('priority_npc_ahead', ('ego', 'PriorityNPCAhead'), False),
+    ('priority_peds_ahead', ('ego', 'PriorityPedsAhead'), False),
+    ('reach_destination', ('ego', 'reach_destinaton'), False),
+    ('min_dist_to_ego', ('truth', 'minDistToEgo'), 999),
+    ('nearest_obs_id', ('truth', 'nearestGtObs'), 'None'),
+    ('npc_ahead', ('truth', 'NPCAhead'), 'None'),
+    ('ped_ahead', ('truth', 'PedAhead'), 'None'),
+    ('npc_opposite', ('truth', 'NPCOpposite'), 'None'),
+    ('obs_count', ('truth', 'obsList'), ()),
+    ('traffic_light_dist', ('traffic_lights', 'trafficLightStopLine'), 999),
+    # 新增的高级信号
+    ('v_ego', ('ego', 'v_ego'), 0),
+    ('front_dist', ('ego', 'front_dist'), 999),
+    ('d_safe', ('ego', 'd_safe'), 0),
+    ('v_rel_front', ('ego', 'v_rel_front'), 0),
+    ('thw_front', ('ego', 'thw_front'), 999),
+    ('ttc_front', ('ego', 'ttc_front'), 999),
+    ('a_ego', ('ego', 'a_ego'), 0),
+    ('hard_brake', ('ego', 'HardBrake'), False),
+    ('lane_change_started', ('ego', 'LaneChangeStarted'), False),
+    ('lane_change_finished', ('ego', 'LaneChangeFinished'), False),
+    ('brake_or_lane_change', ('ego', 'BrakeOrLaneChange'), False),
+    ('lat_offset', ('ego', 'lat_offset'), 0),
+    ('in_lane', ('ego', 'InLane'), True),
+    ('gap_safe', ('ego', 'GapSafe'), True),
+    ('red_light_ahead', ('ego', 'RedLightAhead'), False),
+    ('dist_to_red_stopline', ('ego', 'DistToRedStopLine'), 999),
+    ('should_stop_for_red', ('ego', 'ShouldStopForRed'), False),
+    ('stop_sign_ahead_flag', ('ego', 'StopSignAhead'), False),
+    ('dist_to_stop_sign', ('ego', 'DistToStopSign'), 999),
+    ('dist_to_stopline', ('ego', 'DistToStopLine'), 999),
+    ('should_stop_at_stop_sign', ('ego', 'ShouldStopAtStopSign'), False),
+    ('ped_in_crosswalk', ('ego', 'PedInCrosswalk'), False),
+    ('dist_to_crosswalk', ('ego', 'DistToCrosswalk'), 999),
+    ('stopped_duration', ('ego', 'StoppedDuration'), 0),
+    ('unjustified_stop', ('ego', 'UnjustifiedStop'), False),
+)
+
+# 自车CSV表头（含timestamp列）
+EGO_CSV_FIELDNAMES: Tuple[str, ...] = ('timestamp',) + tuple(name for name, _, _ in EGO_CSV_COLUMNS)
+
+# 需要对取出的值再做转换的列
+_EGO_CSV_CONVERTERS: Dict[str, Callable[[Any], Any]] = {
+    'obs_count': len,
+}
+
+
+# 障碍物CSV列名（与export_obstacles_to_csv中每行元组的顺序一致）
+OBSTACLE_CSV_FIELDNAMES: Tuple[str, ...] = (
+    'timestamp', 'obs_id', 'obs_type', 'obs_x', 'obs_y', 'obs_speed',
+    'dist_to_ego', 'lane_type', 'lane_id',
+)
+
+
+def _obstacle_csv_row(ts: Any, obs: Dict) -> Tuple:
+    """按OBSTACLE_CSV_FIELDNAMES的顺序生成一行障碍物CSV数据"""
+    position = obs.get('position', {})
+    current_lane = obs.get('currentLane', {})
+    return (
+        ts,
+        obs.get('id', 'unknown'),
+        obs.get('type', 'unknown'),
+        position.get('x', 0),
+        position.get('y', 0),
+        obs.get('speed', 0),
+        obs.get('distToEgo', 999),
+        current_lane.get('type', 'unknown'),
+        current_lane.get('currentLaneId', 'unknown'),
+    )
+
+
+def _compile_accessor(path: Tuple[str, ...], default: Any) -> Callable[[Dict], Any]:
+    """
+    生成沿键路径取值的函数
+    
+    取值展开为一条连续的下标表达式（如point['ego']['pose']['x']），任一层缺失时返回缺省值，
+    省去dict.get链在每个缺失层构造临时空字典的开销
+    
+    Args:
+        path: 从轨迹点开始逐层取值的键路径
+        default: 缺省值
+    
+    Returns:
+        以轨迹点为参数的取值函数
+    """
+    expr = 'point' + ''.join(f'[{key!r}]' for key in path)
+    source = (
+        "def accessor(point):\n"
+        "    try:\n"
+        f"        return {expr}\n"
+        "    except (KeyError, TypeError):\n"
+        "        return default\n"
+    )
+    namespace = {'default': default}
+    exec(source, namespace)
+    return namespace['accessor']
+
+
+# 与EGO_CSV_COLUMNS一一对应的取值函数，导入时生成一次
+_EGO_CSV_ACCESSORS: Tuple[Callable[[Dict], Any], ...] = tuple(
+    _compile_accessor(path, default) for _, path, default in EGO_CSV_COLUMNS
+)
+
+
+def _area_to_json(area: Any) -> Any:
+    """Shapely对象转换为坐标列表"""
+    try:
+        if hasattr(area, 'exterior'):
+            return list(area.exterior.coords)
+        return str(area)
+    except:
+        return 'Polygon'
+
+
+# _clean_shapely_objects需要继续深入的容器类型
+_CONTAINER_TYPES = frozenset((dict, list))
+
+
 class TraceViewer:
     """轨迹查看器，提供多种格式的轨迹展示"""
     
@@ -18,11 +156,20 @@ class TraceViewer:
         """
         self.pickle_path = pickle_path
         self.data = self._load_pickle()
+        # 时间戳只排序一次，供各导出方法共用
+        self._sorted_ts = sorted(self.data.get('trace', {}).keys())
     
     def _load_pickle(self) -> Dict:
-        """加载pickle文件"""
-        with open(self.pickle_path, 'rb') as f:
-            return pickle.load(f)
+        """加载pickle文件（整块读入后一次性反序列化，避免Unpickler逐段read）"""
+        data = Path(self.pickle_path).read_bytes()
+        # 反序列化会一次性创建大量容器对象，期间暂停循环垃圾回收，避免反复扫描新对象
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return pickle.loads(data)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
     
     def show_summary(self):
         """显示轨迹摘要信息"""
@@ -57,85 +204,24 @@ class TraceViewer:
             return
         
         # 获取时间戳列表
-        timestamps = sorted(trace.keys())[:max_rows]
+        timestamps = self._sorted_ts[:max_rows]
         
-        # 准备CSV数据
-        rows = []
-        for ts in timestamps:
-            point = trace[ts]
-            ego = point.get('ego', {})
-            truth = point.get('truth', {})
-            traffic_lights = point.get('traffic_lights', {})
-            
-            # 提取关键信息
-            pose = ego.get('pose', {})
-            position = pose.get('position', {})
-            chassis = ego.get('Chassis', {})
-            
-            row = {
-                'timestamp': ts,
-                'ego_x': position.get('x', 0),
-                'ego_y': position.get('y', 0),
-                'ego_z': position.get('z', 0),
-                'ego_heading': pose.get('heading', 0),
-                'ego_speed': chassis.get('speed', 0),
-                'ego_gear': chassis.get('gearLocation', 0),
-                'planning_turn': ego.get('planning_of_turn', 0),
-                'is_overtaking': ego.get('isOverTaking', False),
-                'is_lane_changing': ego.get('isLaneChanging', False),
-                'is_turning_around': ego.get('isTurningAround', False),
-                'current_lane_id': ego.get('currentLane', {}).get('currentLaneId', 'None'),
-                'current_lane_type': ego.get('currentLane', {}).get('type', 'None'),
-                'crosswalk_ahead': ego.get('crosswalkAhead', 999),
-                'junction_ahead': ego.get('junctionAhead', 999),
-                'stop_sign_ahead': ego.get('stopSignAhead', 999),
-                'stopline_ahead': ego.get('stoplineAhead', 999),
-                'is_traffic_jam': ego.get('isTrafficJam', False),
-                'priority_npc_ahead': ego.get('PriorityNPCAhead', False),
-                'priority_peds_ahead': ego.get('PriorityPedsAhead', False),
-                'reach_destination': ego.get('reach_destinaton', False),
-                'min_dist_to_ego': truth.get('minDistToEgo', 999),
-                'nearest_obs_id': truth.get('nearestGtObs', 'None'),
-                'npc_ahead': truth.get('NPCAhead', 'None'),
-                'ped_ahead': truth.get('PedAhead', 'None'),
-                'npc_opposite': truth.get('NPCOpposite', 'None'),
-                'obs_count': len(truth.get('obsList', [])),
-                'traffic_light_dist': traffic_lights.get('trafficLightStopLine', 999),
-                # 新增的高级信号
-                'v_ego': ego.get('v_ego', 0),
-                'front_dist': ego.get('front_dist', 999),
-                'd_safe': ego.get('d_safe', 0),
-                'v_rel_front': ego.get('v_rel_front', 0),
-                'thw_front': ego.get('thw_front', 999),
-                'ttc_front': ego.get('ttc_front', 999),
-                'a_ego': ego.get('a_ego', 0),
-                'hard_brake': ego.get('HardBrake', False),
-                'lane_change_started': ego.get('LaneChangeStarted', False),
-                'lane_change_finished': ego.get('LaneChangeFinished', False),
-                'brake_or_lane_change': ego.get('BrakeOrLaneChange', False),
-                'lat_offset': ego.get('lat_offset', 0),
-                'in_lane': ego.get('InLane', True),
-                'gap_safe': ego.get('GapSafe', True),
-                'red_light_ahead': ego.get('RedLightAhead', False),
-                'dist_to_red_stopline': ego.get('DistToRedStopLine', 999),
-                'should_stop_for_red': ego.get('ShouldStopForRed', False),
-                'stop_sign_ahead_flag': ego.get('StopSignAhead', False),
-                'dist_to_stop_sign': ego.get('DistToStopSign', 999),
-                'dist_to_stopline': ego.get('DistToStopLine', 999),
-                'should_stop_at_stop_sign': ego.get('ShouldStopAtStopSign', False),
-                'ped_in_crosswalk': ego.get('PedInCrosswalk', False),
-                'dist_to_crosswalk': ego.get('DistToCrosswalk', 999),
-                'stopped_duration': ego.get('StoppedDuration', 0),
-                'unjustified_stop': ego.get('UnjustifiedStop', False),
-            }
-            rows.append(row)
+        # 按列收集CSV数据：每列一个列表，不再为每个时间戳构造一个50余键的字典
+        columns = [timestamps]
+        points = [trace[ts] for ts in timestamps]
+        for (name, _, _), accessor in zip(EGO_CSV_COLUMNS, _EGO_CSV_ACCESSORS):
+            column = [accessor(point) for point in points]
+            convert = _EGO_CSV_CONVERTERS.get(name)
+            if convert is not None:
+                column = [convert(value) for value in column]
+            columns.append(column)
+        rows = list(zip(*columns))
         
         # 写入CSV
         if rows:
-            fieldnames = rows[0].keys()
             with open(output_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
+                writer = csv.writer(f)
+                writer.writerow(EGO_CSV_FIELDNAMES)
                 writer.writerows(rows)
             
             print(f"✓ 已导出 {len(rows)} 行数据到: {output_path}")
@@ -155,41 +241,28 @@ class TraceViewer:
             print("警告: 轨迹数据为空")
             return
         
-        timestamps = sorted(trace.keys())[:max_rows]
+        timestamps = self._sorted_ts[:max_rows]
         
-        rows = []
-        for ts in timestamps:
-            point = trace[ts]
-            truth = point.get('truth', {})
-            obs_list = truth.get('obsList', [])
-            
-            for obs in obs_list:
-                position = obs.get('position', {})
-                current_lane = obs.get('currentLane', {})
+        # 先确认存在障碍物，保持"无数据不生成文件"的行为
+        if not any(trace[ts].get('truth', {}).get('obsList') for ts in timestamps):
+            print("警告: 没有障碍物数据可导出")
+            return
+        
+        # 边遍历边写出，不在内存中缓存全部行
+        row_count = 0
+        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(OBSTACLE_CSV_FIELDNAMES)
+            for ts in timestamps:
+                point = trace[ts]
+                truth = point.get('truth', {})
+                obs_list = truth.get('obsList', [])
                 
-                row = {
-                    'timestamp': ts,
-                    'obs_id': obs.get('id', 'unknown'),
-                    'obs_type': obs.get('type', 'unknown'),
-                    'obs_x': position.get('x', 0),
-                    'obs_y': position.get('y', 0),
-                    'obs_speed': obs.get('speed', 0),
-                    'dist_to_ego': obs.get('distToEgo', 999),
-                    'lane_type': current_lane.get('type', 'unknown'),
-                    'lane_id': current_lane.get('currentLaneId', 'unknown'),
-                }
-                rows.append(row)
+                # 每个时间戳的障碍物行整体交给writerows，走_csv的C循环
+                writer.writerows(_obstacle_csv_row(ts, obs) for obs in obs_list)
+                row_count += len(obs_list)
         
-        if rows:
-            fieldnames = rows[0].keys()
-            with open(output_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                writer.writeheader()
-                writer.writerows(rows)
-            
-            print(f"✓ 已导出 {len(rows)} 条障碍物数据到: {output_path}")
-        else:
-            print("警告: 没有障碍物数据可导出")
+        print(f"✓ 已导出 {row_count} 条障碍物数据到: {output_path}")
     
     def export_to_json(self, output_path: str, max_timestamps: int = 10):
         """
@@ -204,7 +277,7 @@ class TraceViewer:
             print("警告: 轨迹数据为空")
             return
         
-        timestamps = sorted(trace.keys())[:max_timestamps]
+        timestamps = self._sorted_ts[:max_timestamps]
         
         # 构建JSON数据（需要处理Shapely对象）
         export_data = {
@@ -230,26 +303,53 @@ class TraceViewer:
         print(f"✓ 已导出 {len(timestamps)} 个时间戳的数据到: {output_path}")
     
     def _clean_shapely_objects(self, obj: Any) -> Any:
-        """递归清理Shapely对象，转换为可JSON序列化的格式"""
-        if isinstance(obj, dict):
-            cleaned = {}
-            for k, v in obj.items():
-                if k == 'area':
-                    # Shapely对象转换为坐标列表
-                    try:
-                        if hasattr(v, 'exterior'):
-                            cleaned[k] = list(v.exterior.coords)
-                        else:
-                            cleaned[k] = str(v)
-                    except:
-                        cleaned[k] = 'Polygon'
-                else:
-                    cleaned[k] = self._clean_shapely_objects(v)
-            return cleaned
-        elif isinstance(obj, list):
-            return [self._clean_shapely_objects(item) for item in obj]
-        else:
+        """
+        清理Shapely对象，转换为可JSON序列化的格式
+        
+        用显式栈代替递归逐层复制dict/list：父容器中先放入空的子容器，子容器出栈时再填充，
+        键和元素顺序与原数据一致。没有嵌套容器的叶子dict/list（dict还须不含area）不再复制，
+        结果中直接引用原对象，调用方只做序列化，不会修改它们
+        """
+        root_type = type(obj)
+        if root_type is not dict and root_type is not list:
             return obj
+        
+        root = {} if root_type is dict else []
+        stack = [(obj, root)]
+        while stack:
+            source, target = stack.pop()
+            if type(source) is dict:
+                for k, v in source.items():
+                    if k == 'area':
+                        target[k] = _area_to_json(v)
+                        continue
+                    value_type = type(v)
+                    if value_type is dict:
+                        if 'area' in v or not _CONTAINER_TYPES.isdisjoint(map(type, v.values())):
+                            child = {}
+                            stack.append((v, child))
+                            v = child
+                    elif value_type is list:
+                        if not _CONTAINER_TYPES.isdisjoint(map(type, v)):
+                            child = []
+                            stack.append((v, child))
+                            v = child
+                    target[k] = v
+            else:
+                for v in source:
+                    value_type = type(v)
+                    if value_type is dict:
+                        if 'area' in v or not _CONTAINER_TYPES.isdisjoint(map(type, v.values())):
+                            child = {}
+                            stack.append((v, child))
+                            v = child
+                    elif value_type is list:
+                        if not _CONTAINER_TYPES.isdisjoint(map(type, v)):
+                            child = []
+                            stack.append((v, child))
+                            v = child
+                    target.append(v)
+        return root
     
     def show_first_n_timestamps(self, n: int = 5):
         """
@@ -263,7 +363,7 @@ class TraceViewer:
             print("警告: 轨迹数据为空")
             return
         
-        timestamps = sorted(trace.keys())[:n]
+        timestamps = self._sorted_ts[:n]
         
         print("\n" + "=" * 60)
         print(f"前 {len(timestamps)} 个时间戳的详细信息")
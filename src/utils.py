@@ -1,22 +1,21 @@
 """工具函数模块"""
 import math
 import numpy as np
-from typing import Optional, List, Tuple
+from typing import List, Tuple
 
 
-def find_nearest_time(time_list: List[float], target: float) -> Optional[float]:
+def find_nearest_time_index(sorted_times: np.ndarray, target: float) -> int:
     """
-    在时间列表中查找小于目标时间的最近时间戳
+    在已排序的时间戳数组中二分查找小于目标时间的最近时间戳
     
     Args:
-        time_list: 时间戳列表
+        sorted_times: 升序排列的时间戳数组
         target: 目标时间戳
     
     Returns:
-        最近的时间戳，如果不存在则返回None
+        最近时间戳的下标，如果不存在则返回-1
     """
-    filtered_array = np.array(list(time_list))[np.array(list(time_list)) < target]
-    return None if len(filtered_array) == 0 else np.max(filtered_array)
+    return int(np.searchsorted(sorted_times, target, side='left')) - 1
 
 
 def convert_velocity_to_speed(velocity: dict) -> float:
@@ -29,10 +28,22 @@ def convert_velocity_to_speed(velocity: dict) -> float:
     Returns:
         速度标量值
     """
-    x = velocity.get('x', 0)
-    y = velocity.get('y', 0)
-    z = velocity.get('z', 0)
-    return math.sqrt(x*x + y*y + z*z)
+    return math.hypot(velocity.get('x', 0), velocity.get('y', 0), velocity.get('z', 0))
+
+
+def lookup_enum(lut: Tuple[int, ...], value: int, default: int = 0) -> int:
+    """
+    用protobuf枚举整数值查表
+    
+    Args:
+        lut: 按枚举值索引的查找表
+        value: 枚举整数值
+        default: 超出查找表范围时的返回值
+    
+    Returns:
+        查找结果
+    """
+    return lut[value] if 0 <= value < len(lut) else default
 
 
 def rotate_point(x: float, y: float, angle: float, center_x: float, center_y: float) -> Tuple[float, float]:
@@ -48,8 +59,10 @@ def rotate_point(x: float, y: float, angle: float, center_x: float, center_y: fl
         旋转后的坐标 (x, y)
     """
     angle = -angle
-    rotated_x = (x - center_x) * math.cos(angle) + (y - center_y) * math.sin(angle) + center_x
-    rotated_y = (y - center_y) * math.cos(angle) - (x - center_x) * math.sin(angle) + center_y
+    cos_a = math.cos(angle)
+    sin_a = math.sin(angle)
+    rotated_x = (x - center_x) * cos_a + (y - center_y) * sin_a + center_x
+    rotated_y = (y - center_y) * cos_a - (x - center_x) * sin_a + center_y
     return rotated_x, rotated_y
 
 
@@ -69,8 +82,6 @@ def calculate_polygon_points(center_x: float, center_y: float,
     Returns:
         四个角点坐标列表
     """
-    result = []
-    
     # 计算四个角点（相对于中心点）
     if wheelbase > 0:
         # 自车需要考虑轴距
@@ -91,12 +102,62 @@ def calculate_polygon_points(center_x: float, center_y: float,
         (center_x - half_length_back, center_y + half_width)
     ]
     
-    # 应用旋转
-    for corner_x, corner_y in corners:
-        rotated = rotate_point(corner_x, corner_y, heading, center_x, center_y)
-        result.append(rotated)
+    # 应用旋转（同rotate_point，三角函数只算一次；保留先平移再相减的写法以保证结果逐位一致）
+    cos_a = math.cos(-heading)
+    sin_a = math.sin(-heading)
+    return [
+        ((corner_x - center_x) * cos_a + (corner_y - center_y) * sin_a + center_x,
+         (corner_y - center_y) * cos_a - (corner_x - center_x) * sin_a + center_y)
+        for corner_x, corner_y in corners
+    ]
+
+
+def calculate_polygon_points_batch(center_x: np.ndarray, center_y: np.ndarray,
+                                   length: np.ndarray, width: np.ndarray,
+                                   heading: np.ndarray, wheelbase: float = 0) -> np.ndarray:
+    """
+    批量计算矩形物体的四个角点坐标，逐元素运算顺序与calculate_polygon_points一致
+    
+    Args:
+        center_x, center_y: 中心点坐标数组
+        length: 长度数组
+        width: 宽度数组
+        heading: 朝向角度数组（弧度）
+        wheelbase: 轴距（如果是自车需要考虑）
+    
+    Returns:
+        形状为(N, 4, 2)的角点坐标数组，角点顺序同calculate_polygon_points
+    """
+    center_x = np.asarray(center_x, dtype=float)
+    center_y = np.asarray(center_y, dtype=float)
+    length = np.asarray(length, dtype=float)
+    width = np.asarray(width, dtype=float)
+    
+    if wheelbase > 0:
+        half_length_front = (length - wheelbase) / 2 + wheelbase
+        half_length_back = (length - wheelbase) / 2
+    else:
+        half_length_front = length / 2
+        half_length_back = length / 2
+    
+    half_width = width / 2
     
-    return result
+    # 四个角点：前右、前左、后左、后右，形状(N, 4)
+    corners_x = np.stack([center_x + half_length_front, center_x + half_length_front,
+                          center_x - half_length_back, center_x - half_length_back], axis=1)
+    corners_y = np.stack([center_y + half_width, center_y - half_width,
+                          center_y - half_width, center_y + half_width], axis=1)
+    
+    # 应用旋转（同rotate_point）
+    angle = -np.asarray(heading, dtype=float)[:, None]
+    cos_a = np.cos(angle)
+    sin_a = np.sin(angle)
+    dx = corners_x - center_x[:, None]
+    dy = corners_y - center_y[:, None]
+    rotated_x = dx * cos_a + dy * sin_a + center_x[:, None]
+    rotated_y = dy * cos_a - dx * sin_a + center_y[:, None]
+    
+    return np.stack([rotated_x, rotated_y], axis=2)
 
 
 def normalize_angle(angle: float) -> float:
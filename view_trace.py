@@ -1,12 +1,24 @@
 #!/usr/bin/env python3
 """独立的轨迹查看器脚本"""
+import os
 import sys
 import argparse
 from pathlib import Path
+from typing import Iterator
 
 from src.trace_viewer import view_trace
 
 
+def _iter_pickle_entries(directory: str) -> Iterator[os.DirEntry]:
+    """递归遍历目录，逐个产出.pickle文件条目"""
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_pickle_entries(entry.path)
+            elif entry.name.endswith('.pickle'):
+                yield entry
+
+
 def find_latest_pickle(base_dir: Path = Path('output')) -> Path:
     """
     查找output目录下最新的pickle文件
@@ -20,16 +32,14 @@ def find_latest_pickle(base_dir: Path = Path('output')) -> Path:
     if not base_dir.exists():
         raise FileNotFoundError(f"目录不存在: {base_dir}")
     
-    # 递归查找所有pickle文件
-    pickle_files = list(base_dir.rglob('*.pickle'))
+    # 递归查找所有pickle文件，单次遍历中取修改时间最新的
+    latest_entry = max(_iter_pickle_entries(str(base_dir)),
+                       key=lambda e: e.stat().st_mtime, default=None)
     
-    if not pickle_files:
+    if latest_entry is None:
         raise FileNotFoundError(f"在 {base_dir} 目录下未找到任何pickle文件")
     
-    # 按修改时间排序，返回最新的
-    latest_pickle = max(pickle_files, key=lambda p: p.stat().st_mtime)
-    
-    return latest_pickle
+    return Path(latest_entry.path)
 
 
 def main():